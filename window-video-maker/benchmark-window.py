@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+CREATE_WINDOW = os.path.join(os.path.dirname(os.path.abspath(__file__)), "create-window.py")
+
+# create-window.py arguments for each render mode that is benchmarked
+MODES = {
+    "frames-opencv": ["-e", "opencv"],
+    "frames-x264": ["-e", "libx264"],
+    "segments": ["-s"],
+    "segments-jobs": ["-j", str(os.cpu_count() or 1)],
+    "vfr": ["--vfr"],
+    "frames-fit-blur": ["-e", "opencv", "--fit", "blur"],
+    "frames-crossfade": ["-e", "opencv", "--transition", "crossfade"],
+    "frames-ken-burns": ["-e", "opencv", "--ken-burns"],
+    "frames-ffmpeg-ingest": ["-e", "opencv", "--ingest", "ffmpeg"],
+    "frames-targets": ["-e", "opencv", "--targets", "portrait", "foyer"],
+}
+
+# (render path, vfr, encoder, ingest) each mode's --stats report should show; without
+# ffmpeg create-window.py falls back to frames, the mp4v writer and OpenCV ingest,
+# and the row must not pass as the mode it asked for
+EXPECTED_REPORTS = {
+    "frames-opencv": ("frames", False, "opencv", "opencv"),
+    "frames-x264": ("frames", False, "libx264", "opencv"),
+    "segments": ("segments", False, "libx264", "opencv"),
+    "segments-jobs": ("segments", False, "libx264", "opencv"),
+    "vfr": ("segments", True, "libx264", "opencv"),
+    "frames-fit-blur": ("frames", False, "opencv", "opencv"),
+    "frames-crossfade": ("frames", False, "opencv", "opencv"),
+    "frames-ken-burns": ("frames", False, "opencv", "opencv"),
+    "frames-ffmpeg-ingest": ("frames", False, "opencv", "ffmpeg"),
+    "frames-targets": ("frames", False, "opencv", "opencv"),
+}
+
+# (width, height) of the generated PNGs, from small posters to oversized exports
+PNG_SIZES = [(768, 1360), (1080, 1920), (2160, 3840)]
+
+def make_poster(width, height, seed):
+    """A portrait poster-like image: gradient background, blocks of colour and text."""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    for channel in range(3):
+        image[:, :, channel] = (gradient * rng.uniform(0.3, 1.0) + rng.uniform(0, 80)).clip(0, 255)
+    for _ in range(12):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        w, h = rng.integers(width // 10, width // 2), rng.integers(height // 20, height // 4)
+        colour = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.rectangle(image, (int(x), int(y)), (int(x + w), int(y + h)), colour, -1)
+    scale = width / 400
+    cv2.putText(image, f"Poster {seed}", (width // 10, height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                scale, (255, 255, 255), max(1, int(scale * 2)))
+    return image
+
+def build_assets(work_folder, image_count, video_count, video_seconds):
+    """Create images/ and videos/ folders of synthetic assets in work_folder."""
+    image_folder = os.path.join(work_folder, "images")
+    video_folder = os.path.join(work_folder, "videos")
+    os.makedirs(image_folder, exist_ok=True)
+    os.makedirs(video_folder, exist_ok=True)
+
+    for index in range(image_count):
+        cv2.imwrite(os.path.join(image_folder, f"poster_{index:03d}.jpg"), make_poster(1080, 1920, index))
+    for width, height in PNG_SIZES:
+        cv2.imwrite(os.path.join(image_folder, f"export_{width}x{height}.png"), make_poster(width, height, width))
+
+    if video_count and not shutil.which("ffmpeg"):
+        print("ffmpeg not found on PATH, the benchmark will not include video assets")
+        video_count = 0
+    for index in range(video_count):
+        subprocess.run(["ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                        "-f", "lavfi", "-i", f"testsrc=size=1080x1920:rate=30:duration={video_seconds}",
+                        "-pix_fmt", "yuv420p", os.path.join(video_folder, f"clip_{index:02d}.mp4")], check=True)
+    print(f"Built {image_count} JPEGs, {len(PNG_SIZES)} PNGs and {video_count} videos in {work_folder}")
+
+def run_mode(work_folder, mode, fps, warm_cache):
+    """Run create-window.py for one mode in its own process and return its --stats report."""
+    output_folder = os.path.join(work_folder, "output", mode)
+    shutil.rmtree(output_folder, ignore_errors=True)
+    os.makedirs(output_folder)
+    stats_file = os.path.join(output_folder, "stats.json")
+    cache_folder = os.path.join(work_folder, "cache")
+    if not warm_cache:
+        shutil.rmtree(cache_folder, ignore_errors=True)
+
+    command = [sys.executable, CREATE_WINDOW, "-o", output_folder, "-f", str(fps),
+               "--cache", cache_folder, "--stats", stats_file] + MODES[mode]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=work_folder, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0 or not os.path.exists(stats_file):
+        print(result.stdout[-2000:])
+        print(result.stderr[-2000:])
+        raise RuntimeError(f"{mode} render failed with exit code {result.returncode}")
+
+    with open(stats_file, encoding="utf-8") as stats_input:
+        stats = json.load(stats_input)
+    peaks = [mb for mb in (stats["peak_rss_mb"], stats["peak_rss_children_mb"]) if mb is not None]
+    rendered_as = (stats["mode"], bool(stats.get("vfr")), stats.get("encoder"), stats.get("ingest"))
+    expected = EXPECTED_REPORTS[mode]
+    if rendered_as != expected:
+        print(f"Warning: {mode} rendered as {describe_render(*rendered_as)}, not {describe_render(*expected)}; "
+              f"its row is flagged as a fallback")
+    return {
+        "mode": mode,
+        "report_mode": stats["mode"],
+        "vfr": rendered_as[1],
+        "fallback": rendered_as != expected,
+        "wall": wall,
+        "render": stats["elapsed"],
+        "frames": stats["frames"],
+        "duration": stats["duration"],
+        "frames_per_second": stats["frames"] / wall if wall else 0.0,
+        "output_bytes": stats["output_bytes"],
+        "peak_rss_mb": max(peaks) if peaks else None,
+        "stages": stats["stages"],
+    }
+
+def describe_render(mode, vfr, encoder, ingest):
+    """A report's render path in words, e.g. "segments vfr, libx264 encoder, opencv ingest"."""
+    return f"{mode}{' vfr' if vfr else ''}, {encoder} encoder, {ingest} ingest"
+
+def print_table(results):
+    print(f"{'mode':<22}{'wall s':>9}{'video s':>9}{'frames':>8}{'fps':>9}{'MB out':>9}{'peak MB':>9}")
+    for result in results:
+        peak = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+        mode = result["mode"] + (" (fell back)" if result["fallback"] else "")
+        print(f"{mode:<22}{result['wall']:>9.1f}{result['duration']:>9.1f}{result['frames']:>8}{result['frames_per_second']:>9.1f}"
+              f"{(result['output_bytes'] or 0) / 1e6:>9.1f}{peak:>9}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='Window Video Benchmark',
+                    description='Time create-window.py render modes on synthetic assets',
+                    epilog='')
+    parser.add_argument('--images', type=int, default=12, help='Number of portrait JPEGs to generate (default: 12)')
+    parser.add_argument('--videos', type=int, default=2, help='Number of testsrc videos to generate (default: 2)')
+    parser.add_argument('--video-seconds', type=float, default=5, help='Length of each generated video (default: 5)')
+    parser.add_argument('-f', '--fps', type=float, default=10, help='Output frames per second (default: 10)')
+    parser.add_argument('-m', '--modes', nargs='+', choices=list(MODES), default=list(MODES), help='Render modes to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per mode (default: 1)')
+    parser.add_argument('--warm-cache', action='store_true', help='Keep the frame cache between runs instead of starting cold')
+    parser.add_argument('-w', '--work', help='Folder for the generated assets and renders (default: a temporary folder)')
+    parser.add_argument('-r', '--results', default='benchmark-results.jsonl', help='File the results are appended to (default: benchmark-results.jsonl)')
+    args = parser.parse_args()
+
+    work_folder = os.path.abspath(args.work) if args.work else tempfile.mkdtemp(prefix="window-bench-")
+    build_assets(work_folder, args.images, args.videos, args.video_seconds)
+
+    run_at = datetime.datetime.now().isoformat(timespec="seconds")
+    results = []
+    for mode in args.modes:
+        for run in range(args.repeat):
+            print(f"Running {mode} ({run + 1} of {args.repeat})")
+            result = run_mode(work_folder, mode, args.fps, args.warm_cache)
+            result.update({"run_at": run_at, "run": run, "fps": args.fps, "images": args.images + len(PNG_SIZES),
+                           "videos": args.videos, "video_seconds": args.video_seconds, "cpu_count": os.cpu_count()})
+            results.append(result)
+
+    with open(args.results, "a", encoding="utf-8") as results_file:
+        for result in results:
+            results_file.write(json.dumps(result) + "\n")
+    print_table(results)
+    print(f"Results appended to {args.results}")
+    if not args.work:
+        shutil.rmtree(work_folder)
@@ -1,98 +1,1456 @@
 import random
 import cv2
 import os
-from natsort import natsorted
 import datetime
 import argparse
+import shutil
+import subprocess
+import tempfile
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import queue
+import threading
+import time
+import platform
+import sys
+import functools
+import math
+import zlib
+import numpy as np
+from window_compositor import Compositor, KenBurns, Overlay, Retarget, Transition, CANVAS_SIZE, FIT_MODES, OUTPUT_SIZE, OUTPUT_TARGETS, TRANSITIONS, ffmpeg_fit_filter, ken_burns_schedule
+from window_playlist import folder_playlist, load_playlist, plan_schedule, probe_image_size, probe_video, video_frame_range
+from window_watch import folder_snapshot, watch_folders
 
-def create_video_from_images(image_folder, video_folder,output_video, fps=0.1, randomise=False):
+# frames held between pipeline stages
+FRAME_QUEUE_SIZE = 8
+
+# how many assets stills are loaded ahead of, and the memory they may hold meanwhile
+PREFETCH_ASSETS = 4
+PREFETCH_MB = 256
+# seconds between progress lines
+PROGRESS_INTERVAL = 2.0
+# rough seconds to encode one 1080p frame on one core at the veryfast
+# preset, for the --plan estimate
+ENCODE_SECONDS_PER_FRAME = {"opencv": 0.015, "libx264": 0.035, "libx265": 0.11}
+# chunks/<render key>/ file that lists the chunks of a render that are complete
+CHECKPOINT_FILE = "checkpoint.json"
+
+# name --watch moves every finished render onto, so the window player can follow one file
+LIVE_NAME = "window_live"
+
+# JPEG decode reductions, largest first
+JPEG_REDUCTIONS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def create_video_from_images(image_folder, video_folder, output_video, *, fps=0.1, randomise=False, segments=False, cache_folder=None, cache_limit_mb=1024, rebuild=False, jobs=1, encoder=None, vfr=False, decode_threads=2, queue_size=FRAME_QUEUE_SIZE, fit="stretch", overlay=None, transition="cut", transition_seconds=1.0, ken_burns_zoom=None, playlist=None, plan_only=False, ingest="opencv", targets=(), chunk_seconds=None, prefetch=PREFETCH_ASSETS, prefetch_mb=PREFETCH_MB):
     default_length=15   
     loop_count=1
-    images = [img for img in os.listdir(image_folder) if img.endswith(".png") or img.endswith(".jpg")or img.endswith(".jpeg")]
-    if not images:
-        print("No images found in the folder.")
-        return
-    
-    videos=[vid for vid in os.listdir(video_folder) if vid.endswith(".mp4")]
-    if videos:
-        print(f"{len(videos)} Videos found in the folder.")
+    started = time.perf_counter()
+    if playlist:
+        # a playlist file sets the order, timings and loops instead of the folders
+        entries = list(playlist["items"])
+        default_length = playlist["default_length"]
+        loop_count = playlist["loop_count"]
+        transition = playlist["transition"] or transition
+        if playlist["transition_length"] is not None:
+            transition_seconds = float(playlist["transition_length"])
+        if randomise:
+            random.shuffle(entries)
+            print("Randomised the order of the playlist")
+    else:
+        entries = folder_playlist(image_folder, video_folder, randomise)
+        if not entries:
+            return
+
+    plan = plan_schedule(entries, fps, default_length, loop_count, transition, transition_seconds)
+    unreadable = sorted({item["path"] for item in plan["items"] if item.get("unreadable")})
+    if unreadable and not plan_only:
+        for path in unreadable:
+            print(f"Skipping {os.path.basename(path)}, it could not be opened as a video")
+        entries = [entry for entry in entries if entry["path"] not in unreadable]
+        if not entries:
+            print("No assets left to render")
+            return None
+        plan = plan_schedule(entries, fps, default_length, loop_count, transition, transition_seconds)
+    print(f"Planned {len(plan['items'])} assets, {plan['frames']} frames, {plan['duration']:.1f}s of video")
+
+    if targets and segments:
+        # every target comes from the same frames, segments would render each asset once per target
+        print("Extra targets are rendered frame by frame in one pass, not as segments")
+        segments = False
+        vfr = False
+    if segments and chunk_seconds:
+        print("Segments are already reused on a rerun, chunks only apply to frame by frame rendering")
+    if segments and any(item["transition_frames"] for item in plan["items"]):
+        # segments are joined by stream copy, there is nowhere to blend them
+        print("Transitions are rendered frame by frame, not as segments")
+        segments = False
+    if vfr and ken_burns_zoom:
+        # a moving still needs every frame, it cannot be one frame held on screen
+        print("Ken Burns stills are rendered at a constant frame rate, ignoring --vfr")
+        vfr = False
 
-    assets=images+videos
+    if plan_only:
+        print_plan(plan, fps, fit=fit, encoder=encoder, segments=segments and bool(shutil.which("ffmpeg")), vfr=vfr,
+                   jobs=jobs, ken_burns_zoom=ken_burns_zoom, targets=targets)
+        return None
 
-    print(f"Found {len(assets)} assets in the folders.")
+    if segments:
+        if shutil.which("ffmpeg"):
+            return create_video_from_segments(plan, output_video, fps, default_length, cache_folder=cache_folder,
+                                              cache_limit_mb=cache_limit_mb, rebuild=rebuild, jobs=jobs, encoder=encoder,
+                                              vfr=vfr, fit=fit, overlay=overlay, ken_burns_zoom=ken_burns_zoom, ingest=ingest)
+        print("ffmpeg not found on PATH, falling back to frame by frame rendering")
 
-    if randomise:
-        random.shuffle(assets)
-        print("Randomised the order of assets")
+    items = plan["items"]
+    render_target = output_video
+    copy_loops = loops_by_copy(plan)
+    if copy_loops:
+        # render one pass and repeat it by stream copy, extra loops only cost the I/O
+        items = [item for item in items if item["loop"] == 0]
+        render_target = os.path.splitext(output_video)[0] + "_pass.mp4"
+    elif loop_count > 1:
+        print("Rendering every loop, looping by stream copy needs ffmpeg and a cut where the playlist restarts")
+
+    if targets:
+        print(f"Rendering {', '.join(name for name, size in targets)} alongside the window in the same pass")
+    # how every frame is loaded, composed and overlaid, whether in one piece or in chunks
+    pipeline_settings = dict(cache_folder=cache_folder, cache_limit_mb=cache_limit_mb, decode_threads=decode_threads,
+                             queue_size=queue_size, fit=fit, overlay=overlay, ken_burns_zoom=ken_burns_zoom,
+                             ingest=ingest, prefetch=prefetch, prefetch_mb=prefetch_mb)
+    chunks_resumed = 0
+    if chunk_seconds and not shutil.which("ffmpeg"):
+        print("ffmpeg not found on PATH, rendering in one piece instead of chunks")
+    if chunk_seconds and shutil.which("ffmpeg"):
+        frames_written, stats, chunks_resumed = render_in_chunks(
+            items, render_target, fps, chunk_seconds, encoder=encoder, targets=targets, rebuild=rebuild,
+            **pipeline_settings)
     else:
-        assets = natsorted(assets)
-        print("assets will be displayed in the order they are named")
-
-    frame = cv2.imread(os.path.join(image_folder, images[0]))
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    video = cv2.VideoWriter(output_video, fourcc, fps, (1920, 1080))
-
-    for _ in range(loop_count):#loop twice
-        for asset in assets:
-            if asset.endswith(".mp4"):
-                print(f"Adding video {asset} to the video")
-                video_path = os.path.join(video_folder, asset)
-                print(f"Reading video from {video_path}")
-                cap = cv2.VideoCapture(video_path)
-                print(f"Reading video from {video_path}")
-                video_fps = cap.get(cv2.CAP_PROP_FPS)
-                print(f"Video fps={video_fps}")
-                frame_count=0
-                number_of_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                print(f"Number of frames in the video={number_of_frames}")
-                
-                # 30fps video, 10fps output, skip every 3rd frame
-                frames_to_skip = int(video_fps/fps)
-                print(f"Frames to skip={frames_to_skip}")
-                frames_written=0
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    if not (frame.shape[0] == 1080 and frame.shape[1] == 1920):
-                        ResizeTo = (1080, 1920)
-                        frame = cv2.resize(frame, ResizeTo)
-                        frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
-                    frame = cv2.resize(frame, (1920, 1080))
-                    frame_count+=1
-                    if frame_count > frames_to_skip:
-                        print(f"Writing frame {frames_written} of {number_of_frames} from this video")
-                        #for _ in range(fps):
-                        video.write(frame)
-                        video.write(frame)
-                        frame_count=0
-                        frames_written+=1
-                cap.release()
-                print(f"{frames_written} frames_written from this video")
+        video = MultiWriter(render_target, fps, encoder, targets) if targets else open_video_writer(render_target, fps, encoder)
+        frames_written, stats = render_frames_pipeline(video, items, fps, **pipeline_settings)
+        video.release()
+    stats.report()
+    concat_seconds = 0.0
+    if copy_loops:
+        concat_started = time.perf_counter()
+        for target_pass, target_video in [(render_target, output_video)] + [
+                (target_path(render_target, name), target_path(output_video, name)) for name, size in targets]:
+            concat_segments([(target_pass, None)] * loop_count, target_video)
+            os.remove(target_pass)
+        concat_seconds = time.perf_counter() - concat_started
+        print(f"Looped the rendered pass {loop_count} times by stream copy in {concat_seconds:.1f}s")
+        frames_written *= loop_count
+    print(f"Video saved as {output_video}")
+    for name, size in targets:
+        print(f"{name.capitalize()} video saved as {target_path(output_video, name)}")
+    pipeline = stats.as_dict()
+    if copy_loops:
+        pipeline["busy"]["concat"] = concat_seconds
+    return stats_report("frames", output_video, fps, frames_written, time.perf_counter() - started,
+                        pipeline["busy"], pipeline["assets"], duration=frames_written / fps, queues=pipeline["queues"],
+                        planned_frames=plan["frames"], loops_copied=loop_count - 1 if copy_loops else 0,
+                        targets={name: target_path(output_video, name) for name, size in targets},
+                        chunks_resumed=chunks_resumed, encoder=encoder["codec"] if encoder else "opencv", ingest=ingest)
+
+def loops_by_copy(plan):
+    """
+    Whether the loops after the first can be stream copies of the first pass.
+
+    That needs ffmpeg for the concat, and a cut where the playlist starts
+    again since a copy cannot blend the end of one pass into the next.
+    """
+    if plan["loop_count"] < 2 or not shutil.which("ffmpeg"):
+        return False
+    first_pass = sum(1 for item in plan["items"] if item["loop"] == 0)
+    return not plan["items"][first_pass]["transition_frames"]
+
+def chunk_ranges(items, fps, chunk_seconds):
+    """
+    Split items into runs of at least chunk_seconds, as (first, end) index pairs.
+
+    A chunk only ends between items, and only where the next item cuts in,
+    since a chunk rendered on its own has no frame before it to blend from.
+    Chunks therefore run over chunk_seconds by up to an item, and a stretch
+    of transitions stays in one chunk.
+    """
+    chunk_frames = max(1, int(fps * chunk_seconds))
+    ranges = []
+    first = 0
+    frames = 0
+    for index, item in enumerate(items):
+        if index > first and frames >= chunk_frames and not item["transition_frames"]:
+            ranges.append((first, index))
+            first = index
+            frames = 0
+        frames += item["frames"]
+    if items:
+        ranges.append((first, len(items)))
+    return ranges
+
+def render_key(items, fps, chunk_seconds, encoder=None, settings=None):
+    """
+    Name for a chunked render of items, the same on a rerun with unchanged assets and settings.
+
+    Assets are told apart by size and modification time rather than content
+    hashes, so working out the key does not read every asset again.
+    """
+    assets = []
+    for item in items:
+        stat = os.stat(item["path"])
+        assets.append([os.path.abspath(item["path"]), stat.st_size, stat.st_mtime_ns, item["kind"], item["frames"],
+                       item["repeats"], item["in"], item["out"], item["transition"], item["transition_frames"]])
+    key = json.dumps([assets, fps, chunk_seconds, encoder, settings], sort_keys=True)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def load_checkpoint(checkpoint_path, key):
+    """The checkpoint of an earlier run of the same render, or a fresh one."""
+    if os.path.exists(checkpoint_path):
+        try:
+            with open(checkpoint_path, encoding="utf-8") as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            if checkpoint.get("key") == key:
+                return checkpoint
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable checkpoint {checkpoint_path}: {e}")
+    return {"key": key, "chunks": {}}
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    # write and rename, so a crash while saving leaves the previous checkpoint
+    partial = checkpoint_path + ".partial"
+    with open(partial, "w", encoding="utf-8") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file, indent=2)
+    os.replace(partial, checkpoint_path)
+
+def render_in_chunks(items, output_video, fps, chunk_seconds, *, encoder=None, targets=(), rebuild=False, cache_folder=None, cache_limit_mb=1024, decode_threads=2, queue_size=FRAME_QUEUE_SIZE, fit="stretch", overlay=None, ken_burns_zoom=None, ingest="opencv", prefetch=PREFETCH_ASSETS, prefetch_mb=PREFETCH_MB):
+    """
+    Render items as chunks of about chunk_seconds and join them into output_video.
+
+    Chunks are kept in chunks/<render key> next to the output with a
+    checkpoint file recording the item range and frame count of every chunk
+    that is complete. A chunk is only recorded once its writer is closed, so
+    a render that dies part way leaves whole chunks behind, and running the
+    same render again picks up at the first missing chunk unless rebuild is
+    set. The chunks are joined by stream copy and removed once the output is
+    written.
+
+    Returns (frames_written, stats, chunks_resumed), counting the frames of
+    resumed chunks in frames_written.
+    """
+    settings = {"fit": fit, "ken_burns": ken_burns_zoom, "ingest": ingest, "targets": [list(target) for target in targets]}
+    if overlay is not None:
+        settings["overlay"] = [file_content_hash(overlay[0])] + list(overlay[1:])
+    key = render_key(items, fps, chunk_seconds, encoder, settings)
+    chunk_folder = os.path.join(os.path.dirname(output_video), "chunks", key[:16])
+    checkpoint_path = os.path.join(chunk_folder, CHECKPOINT_FILE)
+    if rebuild:
+        shutil.rmtree(chunk_folder, ignore_errors=True)
+    os.makedirs(chunk_folder, exist_ok=True)
+    checkpoint = load_checkpoint(checkpoint_path, key)
+
+    ranges = chunk_ranges(items, fps, chunk_seconds)
+    stats = PipelineStats(("decode", "transform", "encode"), ("decoded", "transformed"), items)
+    frames_written = 0
+    chunks_resumed = 0
+    chunk_paths = []
+    for number, (first, end) in enumerate(ranges):
+        chunk_path = os.path.join(chunk_folder, f"chunk_{number:04d}.mp4")
+        chunk_paths.append(chunk_path)
+        done = checkpoint["chunks"].get(str(number))
+        if done and done["items"] == [first, end] and all(
+                os.path.exists(path) for path in [chunk_path] + [target_path(chunk_path, name) for name, size in targets]):
+            frames_written += done["frames"]
+            chunks_resumed += 1
+            continue
+        print(f"Rendering chunk {number + 1} of {len(ranges)}: {items[first]['name']} to {items[end - 1]['name']}")
+        video = MultiWriter(chunk_path, fps, encoder, targets) if targets else open_video_writer(chunk_path, fps, encoder)
+        chunk_frames, chunk_stats = render_frames_pipeline(
+            video, items[first:end], fps, cache_folder=cache_folder, cache_limit_mb=cache_limit_mb,
+            decode_threads=decode_threads, queue_size=queue_size, fit=fit, overlay=overlay,
+            ken_burns_zoom=ken_burns_zoom, ingest=ingest, prefetch=prefetch, prefetch_mb=prefetch_mb)
+        video.release()
+        stats.absorb(chunk_stats, first)
+        frames_written += chunk_frames
+        checkpoint["chunks"][str(number)] = {"items": [first, end], "frames": chunk_frames}
+        save_checkpoint(checkpoint_path, checkpoint)
+    if chunks_resumed:
+        print(f"Resumed {chunks_resumed} of {len(ranges)} chunks from {checkpoint_path}")
+
+    concat_segments([(path, None) for path in chunk_paths], output_video)
+    for name, size in targets:
+        concat_segments([(target_path(path, name), None) for path in chunk_paths], target_path(output_video, name))
+    shutil.rmtree(chunk_folder)
+    if not os.listdir(os.path.dirname(chunk_folder)):
+        os.rmdir(os.path.dirname(chunk_folder))
+    return frames_written, stats, chunks_resumed
+
+def print_plan(plan, fps, fit="stretch", encoder=None, segments=False, vfr=False, jobs=1, ken_burns_zoom=None, targets=()):
+    """
+    List what a render would do, reading only image and video headers.
+
+    The encoded column counts the frames that go through the encoder: every
+    frame when rendering frame by frame, but only one clip per still (a single
+    frame with vfr) when rendering segments, before any segments are reused
+    from the last run. Loops that are stream copies of the first encode none.
+    Extra targets add encode time in proportion to their pixel count.
+    """
+    codec = encoder["codec"] if encoder else "opencv"
+    copy_loops = loops_by_copy(plan)
+    print(f"{'#':>3} {'starts':>7}  {'asset':<32}{'size':>11}{'frames':>8}{'encoded':>9}  work")
+    encoded_total = 0
+    warnings = []
+    for number, item in enumerate(plan["items"], 1):
+        if item["kind"] == "image":
+            size = probe_image_size(item["path"])
+            work = describe_image_work(item["path"], size, fit)
+            if ken_burns_zoom:
+                work += ", Ken Burns"
+        elif item.get("unreadable"):
+            size = None
+            work = "unreadable, skipped"
+        else:
+            size = item["size"]
+            work = f"{item['video_fps']:.0f} fps, keeps {item['frames'] // item['repeats']} of {item['source_frames']} frames"
+            if size != OUTPUT_SIZE:
+                work += ", resize and rotate" if size != CANVAS_SIZE else ", rotate"
+        if item["transition_frames"]:
+            work += f", {item['transition']} in"
+
+        if item["loop"] > 0 and (segments or copy_loops):
+            encoded = 0
+        elif not segments:
+            encoded = item["frames"]
+        elif item["kind"] == "video" or ken_burns_zoom:
+            encoded = item["frames"]
+        else:
+            encoded = 1 if vfr else still_clip_frames(fps, item["repeats"])
+        encoded_total += encoded
+
+        if item.get("unreadable"):
+            warnings.append(f"{item['name']}: could not be opened as a video, the render will skip it")
+        elif size is None:
+            warnings.append(f"{item['name']}: could not read the size from its header")
+        elif fit == "stretch" and size != OUTPUT_SIZE and abs(size[0] / size[1] - 9 / 16) > 0.05:
+            warnings.append(f"{item['name']}: {size[0]}x{size[1]} is not 9:16 and will be stretched, try --fit")
+        if item["frames"] == 0 and not item.get("unreadable"):
+            warnings.append(f"{item['name']}: contributes no frames")
+
+        starts = item["first_frame"] / fps
+        size_text = f"{size[0]}x{size[1]}" if size else "?"
+        print(f"{number:>3} {int(starts // 60):>4}:{int(starts % 60):02d}  {item['name'][:31]:<32}{size_text:>11}"
+              f"{item['frames']:>8}{encoded:>9}  {work}")
+
+    workers = min(jobs, os.cpu_count() or 1) if segments else 1
+    encode_seconds = encoded_total * ENCODE_SECONDS_PER_FRAME.get(codec, ENCODE_SECONDS_PER_FRAME["libx264"]) / workers
+    output_width, output_height = OUTPUT_SIZE
+    encode_seconds *= 1 + sum(width * height for name, (width, height) in targets) / (output_width * output_height)
+    duration = plan["duration"]
+    print(f"{len(plan['items'])} assets, {plan['frames']} frames at {fps} fps, {int(duration // 60)}:{duration % 60:04.1f} of video")
+    print(f"{encoded_total} frames to encode with {codec} ({'segments' if segments else 'frame by frame'}), "
+          f"roughly {encode_seconds:.0f}s of encoding")
+    if targets:
+        print(f"Also encodes {', '.join(f'{name} ({width}x{height})' for name, (width, height) in targets)} from the same frames")
+    for warning in warnings:
+        print(f"Warning: {warning}")
+
+def describe_image_work(img_path, size, fit):
+    """How an image is turned into an output frame, for the plan listing."""
+    if size is None:
+        return "full decode, resize and rotate"
+    if size == OUTPUT_SIZE:
+        return "used as is"
+    if size == CANVAS_SIZE:
+        return "rotate"
+    work = f"{fit} resize and rotate"
+    reduction = jpeg_reduction(img_path, size)
+    if reduction:
+        work = f"1/{reduction[0]} decode, {work}"
+    return work
+
+class FFmpegWriter:
+    """
+    Streams raw BGR frames into an ffmpeg encoder over stdin.
+
+    Has the same write() and release() calls as cv2.VideoWriter, so the render
+    loops do not care which one they are given.
+    """
+    def __init__(self, output_video, fps, size, codec="libx264", preset="veryfast", crf=23, gop_seconds=10):
+        width, height = size
+        gop = max(1, int(fps * gop_seconds))
+        command = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                   "-c:v", codec, "-preset", preset, "-crf", str(crf),
+                   # stills barely change, so a long GOP saves most of the bits
+                   "-g", str(gop), "-pix_fmt", "yuv420p"]
+        if codec == "libx265":
+            command += ["-x265-params", "log-level=error"]
+        command.append(output_video)
+        self.output_video = output_video
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def isOpened(self):
+        return self.process.poll() is None
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.process.wait()
+            raise RuntimeError(f"ffmpeg stopped while writing {self.output_video} (exit code {self.process.returncode})")
+
+    def release(self):
+        if self.process.stdin.closed:
+            return
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {self.output_video} (exit code {self.process.returncode})")
+
+def make_encoder(codec="libx264", preset="veryfast", crf=23, gop_seconds=10):
+    """
+    Encoder settings for open_video_writer.
+
+    Returns None, meaning the OpenCV mp4v writer, when codec is "opencv" or
+    ffmpeg is not on the PATH.
+    """
+    if codec == "opencv":
+        return None
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg not found on PATH, using the OpenCV mp4v writer")
+        return None
+    return {"codec": codec, "preset": preset, "crf": crf, "gop_seconds": gop_seconds}
+
+def open_video_writer(output_video, fps, encoder=None, size=(1920, 1080)):
+    if encoder is None:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        return cv2.VideoWriter(output_video, fourcc, fps, size)
+    return FFmpegWriter(output_video, fps, size, **encoder)
+
+def parse_target(target):
+    """(name, (width, height)) for a --targets entry: a name from OUTPUT_TARGETS or WIDTHxHEIGHT."""
+    if target in OUTPUT_TARGETS:
+        return target, OUTPUT_TARGETS[target]
+    width, _, height = target.lower().partition("x")
+    if not (width.isdigit() and height.isdigit()) or int(width) < 2 or int(height) < 2:
+        raise ValueError(f"{target} is not one of {', '.join(OUTPUT_TARGETS)} or a WIDTHxHEIGHT size")
+    if int(width) % 2 or int(height) % 2:
+        # yuv420p video needs even sizes
+        raise ValueError(f"{target} needs an even width and height")
+    return target.lower(), (int(width), int(height))
+
+def parse_key_colour(colour):
+    """BGR tuple for an --overlay-key colour written as #RRGGBB or R,G,B."""
+    text = colour.strip().lstrip("#")
+    try:
+        if "," in text:
+            red, green, blue = (int(part) for part in text.split(","))
+        elif len(text) == 6:
+            red, green, blue = (int(text[i:i + 2], 16) for i in (0, 2, 4))
+        else:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"{colour} is not a colour, write it as #RRGGBB or R,G,B")
+    if not all(0 <= value <= 255 for value in (red, green, blue)):
+        raise ValueError(f"{colour} has a channel outside 0 to 255")
+    return blue, green, red
+
+def target_path(output_video, name):
+    return f"{os.path.splitext(output_video)[0]}_{name}.mp4"
+
+class MultiWriter:
+    """
+    Writes every frame to the window video and to a video per extra target.
+
+    Each target has its own writer and Retarget, so an asset is decoded and
+    placed on the canvas once however many screens it is rendered for. Has
+    the write() and release() calls of cv2.VideoWriter, and write_repeated()
+    so a still is resized once for each target rather than once per frame.
+    """
+    def __init__(self, output_video, fps, encoder, targets):
+        self.output_video = output_video
+        self.sinks = []
+        try:
+            self.sinks.append((open_video_writer(output_video, fps, encoder), None))
+            for name, size in targets:
+                self.sinks.append((open_video_writer(target_path(output_video, name), fps, encoder, size), Retarget(size)))
+        except BaseException:
+            self.release()
+            raise
+
+    def isOpened(self):
+        return all(writer.isOpened() for writer, retarget in self.sinks)
+
+    def write(self, frame):
+        self.write_repeated(frame, 1)
+
+    def write_repeated(self, frame, repeats):
+        for writer, retarget in self.sinks:
+            target_frame = retarget.render(frame) if retarget else frame
+            for _ in range(repeats):
+                writer.write(target_frame)
+
+    def release(self):
+        for writer, retarget in self.sinks:
+            writer.release()
+
+@functools.lru_cache(maxsize=None)
+def load_overlay(overlay):
+    """
+    The Overlay for an overlay (path, opacity, key) triple, or None without one.
+
+    The template is prepared once per process and shared by every frame.
+    """
+    if overlay is None:
+        return None
+    path, opacity, key = overlay
+    return Overlay(path, opacity, key)
+
+def motion_seed(asset_path):
+    """Seed for a still's Ken Burns move, taken from its name so reruns move the same way."""
+    return zlib.crc32(os.path.basename(asset_path).encode("utf-8"))
+
+def normalize_frame(frame, fit="stretch"):
+    # if the image is already 1920x1080, skip resizing and rotating
+    return Compositor(fit).compose(frame)
+
+def read_image(img_path):
+    """
+    Decode an image, at reduced resolution when it is much larger than the window.
+
+    JPEGs can be decoded at 1/2, 1/4 or 1/8 scale by skipping DCT detail, which
+    cuts decode time and memory for phone photos. The largest reduction that
+    still leaves at least 1080x1920 for normalize_frame to scale down is used.
+    """
+    reduction = jpeg_reduction(img_path, probe_image_size(img_path))
+    if reduction:
+        frame = cv2.imread(img_path, reduction[1])
+        # EXIF orientation can swap the sides, so check what came back
+        if frame is not None and frame.shape[0] >= 1920 and frame.shape[1] >= 1080:
+            return frame
+    return cv2.imread(img_path)
+
+def jpeg_reduction(img_path, size):
+    """(factor, imread flag) of the reduced decode read_image() uses for an image, or None."""
+    if not size or os.path.splitext(img_path)[1].lower() not in (".jpg", ".jpeg"):
+        return None
+    width, height = size
+    for factor, flag in JPEG_REDUCTIONS:
+        if width // factor >= 1080 and height // factor >= 1920:
+            return factor, flag
+    return None
+
+def prefetch_bytes(img_path):
+    """Memory a still holds while it is loaded ahead: its decode at the scale read_image() uses, and its normalized frame."""
+    size = probe_image_size(img_path) or CANVAS_SIZE
+    factor = (jpeg_reduction(img_path, size) or (1,))[0]
+    output_width, output_height = OUTPUT_SIZE
+    return (size[0] // factor) * (size[1] // factor) * 3 + output_width * output_height * 3
+
+def frame_cache_key(img_path, fit="stretch"):
+    """Cache key for an image: its path, size and modification time, and the fit mode."""
+    stat = os.stat(img_path)
+    key = f"{os.path.abspath(img_path)}|{stat.st_size}|{stat.st_mtime_ns}|{fit}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def load_normalized_image(img_path, cache_folder=None, cache_limit_mb=1024, fit="stretch"):
+    """
+    Load an image as a normalized 1920x1080 BGR frame.
+
+    With a cache folder the normalized frame is stored as a raw .npy file and
+    memory-mapped on later loads, so unchanged images are only decoded once.
+    """
+    if not cache_folder:
+        return normalize_frame(read_image(img_path), fit)
+
+    cache_path = os.path.join(cache_folder, frame_cache_key(img_path, fit) + ".npy")
+    if os.path.exists(cache_path):
+        # touch the entry so eviction sees it as recently used
+        os.utime(cache_path)
+        return np.load(cache_path, mmap_mode="r")
+
+    frame = normalize_frame(read_image(img_path), fit)
+    os.makedirs(cache_folder, exist_ok=True)
+    # the same still can be loading on two pool threads at once, so each writes its own file
+    temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+    np.save(temp_path, frame)
+    os.replace(temp_path, cache_path)
+    evict_frame_cache(cache_folder, cache_limit_mb)
+    return frame
+
+def evict_frame_cache(cache_folder, cache_limit_mb):
+    """Remove least recently used cache entries until the folder fits the size limit."""
+    entries = []
+    for name in os.listdir(cache_folder):
+        if name.endswith(".npy") and not name.endswith(".tmp.npy"):
+            try:
+                stat = os.stat(os.path.join(cache_folder, name))
+            except OSError:
+                continue  # removed by another render process
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total_size = sum(size for _, size, _ in entries)
+    limit = cache_limit_mb * 1024 * 1024
+    for _, size, name in sorted(entries):
+        if total_size <= limit:
+            break
+        try:
+            os.remove(os.path.join(cache_folder, name))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # eviction is best effort: on Windows a frame another thread or
+            # worker still has memory-mapped cannot be removed, so keep it
+            continue
+        total_size -= size
+
+def read_video_frames(video_path, fps, start=None, end=None):
+    """
+    Yield the frames of a video that are kept at the output fps, undecoded frames skipped.
+
+    start and end are in and out points in seconds, None for the whole video.
+    """
+    print(f"Adding video {os.path.basename(video_path)} to the video")
+    print(f"Reading video from {video_path}")
+    cap = cv2.VideoCapture(video_path)
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    print(f"Video fps={video_fps}")
+    frame_count=0
+    number_of_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    print(f"Number of frames in the video={number_of_frames}")
+    first, last = video_frame_range(video_fps, number_of_frames, start, end)
+    if end is None:
+        # the header count can be short, read to the real end of the file
+        last = None
+    if first:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    position = first
+
+    # 30fps video, 10fps output, skip every 3rd frame
+    frames_to_skip = int(video_fps/fps)
+    print(f"Frames to skip={frames_to_skip}")
+    frames_written=0
+    try:
+        while last is None or position < last:
+            frame_count+=1
+            position += 1
+            if frame_count <= frames_to_skip:
+                # grab() advances past the frame without converting it to BGR,
+                # and skipped frames never reach the resize and rotate
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+            frame_count=0
+            frames_written+=1
+    finally:
+        cap.release()
+    print(f"{frames_written} frames_written from this video")
+
+def read_video_frames_ffmpeg(video_path, fps, start=None, end=None, fit="stretch"):
+    """
+    Yield the kept frames of a video as finished 1920x1080 output frames from ffmpeg.
+
+    Keeps the same frames as read_video_frames(), but the frame selection,
+    scaling onto the canvas and rotation all happen in ffmpeg's filter graph,
+    so Python only receives frames at the output size and rate instead of
+    full resolution frames to resize. Worthwhile for 4K phone clips.
+    """
+    print(f"Adding video {os.path.basename(video_path)} to the video through ffmpeg")
+    video_fps, frame_count, width, height = probe_video(video_path)
+    first, last = video_frame_range(video_fps, frame_count, start, end)
+    frames_to_skip = int(video_fps/fps)
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin"]
+    if first:
+        command += ["-ss", f"{first / video_fps:.6f}"]
+    command += ["-i", video_path]
+    if end is not None:
+        command += ["-t", f"{(last - first) / video_fps:.6f}"]
+    # one frame kept after every frames_to_skip, counted from the in point
+    graph = f"select=not(mod(n+1\\,{frames_to_skip + 1}))"
+    # like Compositor.compose(), frames already at the output size are taken as finished
+    graph += ",format=bgr24" if (width, height) == OUTPUT_SIZE else "," + ffmpeg_fit_filter(fit)
+    command += ["-filter_complex", graph, "-an", "-vsync", "passthrough",
+                "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+    output_width, output_height = OUTPUT_SIZE
+    frame_bytes = output_width * output_height * 3
+    # a damaged clip can log more than a pipe holds, which would stall ffmpeg
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+        frames_written = 0
+        stopped_early = True
+        try:
+            while True:
+                data = process.stdout.read(frame_bytes)
+                if len(data) < frame_bytes:
+                    break
+                yield np.frombuffer(data, dtype=np.uint8).reshape(output_height, output_width, 3)
+                frames_written += 1
+            stopped_early = False
+        finally:
+            # only stop ffmpeg when the pipeline is shutting down before the end
+            if stopped_early:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+        errors.seek(0)
+        error = errors.read().decode("utf-8", "replace").strip()
+    if process.returncode != 0 and error:
+        raise RuntimeError(f"ffmpeg could not read {video_path}: {error.splitlines()[-1]}")
+    print(f"{frames_written} frames_written from this video")
+
+class ProgressReporter:
+    """
+    Prints render progress every few seconds instead of a line per frame.
+
+    Given the total frames from the plan it also shows how far through the
+    render is and an estimate of the time left at the rate so far.
+    """
+    def __init__(self, label, interval=PROGRESS_INTERVAL, total=None):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.frames = 0
+        self.started = time.perf_counter()
+        self.last_report = self.started
+
+    def update(self, frames, current=None):
+        self.frames += frames
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report(current)
+
+    def report(self, current=None):
+        elapsed = time.perf_counter() - self.started
+        rate = self.frames / elapsed if elapsed else 0
+        line = f"{self.label}: {self.frames} frames in {elapsed:.1f}s ({rate:.1f} fps)"
+        if self.total and rate:
+            remaining = max(0, self.total - self.frames) / rate
+            line += f", {100 * min(self.frames, self.total) / self.total:.0f}% of {self.total}, about {remaining:.0f}s left"
+        if current:
+            line += f", now on {current}"
+        print(line)
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process and of its finished child processes.
+
+    Returns (self_mb, children_mb); the children figure is None where the
+    platform does not report it.
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+        return own, children
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / (1024 * 1024), None
+    return None, None
+
+def stats_report(mode, output_video, fps, frames, elapsed, stages, assets, **extra):
+    """Summary of a render for --stats, comparable between runs and machines."""
+    own_mb, children_mb = peak_rss_mb()
+    report = {
+        "mode": mode,
+        "output": output_video,
+        "output_bytes": os.path.getsize(output_video) if os.path.exists(output_video) else None,
+        "fps": fps,
+        "frames": frames,
+        "elapsed": elapsed,
+        "output_fps": frames / elapsed if elapsed else 0.0,
+        "stages": stages,
+        "assets": assets,
+        "peak_rss_mb": own_mb,
+        "peak_rss_children_mb": children_mb,
+        "machine": {
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+        },
+    }
+    report.update(extra)
+    return report
+
+class PipelineStats:
+    """Busy time per stage and asset, and queue depths seen by the render pipeline."""
+    def __init__(self, stages, queues, items=()):
+        self.lock = threading.Lock()
+        self.busy = {stage: 0.0 for stage in stages}
+        self.depths = {name: [0, 0, 0] for name in queues}  # total, samples, peak
+        self.assets = [dict({"name": item["name"], "kind": item["kind"], "frames": 0, "first_frame": item["first_frame"],
+                             "planned_frames": item["frames"]}, **{stage: 0.0 for stage in stages})
+                       for item in items]
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_busy(self, stage, seconds, index=None):
+        with self.lock:
+            self.busy[stage] += seconds
+            if index is not None:
+                self.assets[index][stage] += seconds
+
+    def sample_depth(self, name, frame_queue):
+        depth = frame_queue.qsize()
+        with self.lock:
+            sample = self.depths[name]
+            sample[0] += depth
+            sample[1] += 1
+            sample[2] = max(sample[2], depth)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def absorb(self, other, first_index=0):
+        """Add the stats of a pipeline run over the items from first_index on."""
+        with self.lock:
+            for stage, seconds in other.busy.items():
+                self.busy[stage] += seconds
+            for offset, asset in enumerate(other.assets):
+                self.assets[first_index + offset] = asset
+            for name, (total, samples, peak) in other.depths.items():
+                sample = self.depths[name]
+                sample[0] += total
+                sample[1] += samples
+                sample[2] = max(sample[2], peak)
+            self.elapsed += other.elapsed
+
+    def as_dict(self):
+        return {
+            "elapsed": self.elapsed,
+            "busy": dict(self.busy),
+            "assets": self.assets,
+            "queues": {name: {"average": total / samples if samples else 0.0, "peak": peak}
+                       for name, (total, samples, peak) in self.depths.items()},
+        }
+
+    def report(self):
+        print(f"Pipeline took {self.elapsed:.1f}s")
+        for stage, seconds in self.busy.items():
+            share = 100 * seconds / self.elapsed if self.elapsed else 0
+            print(f"  {stage} busy {seconds:.1f}s ({share:.0f}%)")
+        for name, depth in self.as_dict()["queues"].items():
+            print(f"  {name} queue depth average {depth['average']:.1f}, peak {depth['peak']}")
+
+def render_frames_pipeline(video, items, fps, *, cache_folder=None, cache_limit_mb=1024, decode_threads=2, queue_size=FRAME_QUEUE_SIZE, fit="stretch", overlay=None, ken_burns_zoom=None, ingest="opencv", prefetch=PREFETCH_ASSETS, prefetch_mb=PREFETCH_MB):
+    """
+    Render a playlist through decode, transform and encode stages.
+
+    items is the items list of plan_schedule(): a still is written repeats
+    times and every kept frame of a video is written repeats times. Videos
+    are read on the decode thread, a transform thread places the frames on the window canvas
+    with a Compositor, blending overlay on top if given, and the calling thread writes them to video. The stages are joined by queues of
+    queue_size frames so memory stays flat whichever stage is slowest.
+
+    Stills are decoded and normalized up to prefetch assets ahead on
+    decode_threads threads, including while a video before them is read,
+    as long as the stills loaded ahead hold under prefetch_mb of frames.
+    OpenCV lets go of the GIL while it decodes and resizes, so the loads
+    run alongside the other stages.
+
+    For an item with a transition other than cut, its first
+    transition_frames frames blend from the last frame of the item before,
+    so transitions take time from the incoming asset rather than adding to it.
+
+    With ken_burns_zoom a still's repeats become that many frames of a slow
+    zoom and pan, following a schedule worked out once per still length.
+
+    With ingest "ffmpeg" videos are read through read_video_frames_ffmpeg(),
+    arriving as finished output frames that the transform stage passes on.
+
+    Returns (frames_written, stats).
+    """
+    stats = PipelineStats(("decode", "transform", "encode"), ("decoded", "transformed"), items)
+    progress = ProgressReporter(os.path.basename(getattr(video, "output_video", "")) or "Rendering",
+                                total=sum(item["frames"] for item in items))
+    decoded = queue.Queue(maxsize=queue_size)
+    transformed = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    failures = []
+
+    def put(frame_queue, item):
+        # give up when a later stage has failed so the thread can exit
+        while not stop.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(frame_queue):
+        # None at the end of the stream, or once the encoder has failed and
+        # nothing upstream will send the end any more
+        while not stop.is_set():
+            try:
+                return frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def load_image(path, index):
+        start = time.perf_counter()
+        frame = load_normalized_image(path, cache_folder, cache_limit_mb, fit)
+        if isinstance(frame, np.memmap):
+            # read a cached frame in now rather than a page at a time in the encoder
+            frame = np.array(frame)
+        stats.add_busy("decode", time.perf_counter() - start, index)
+        return frame
+
+    def decode_stage():
+        ahead = {}  # index: (future, bytes) of the stills being loaded ahead
+        try:
+            with ThreadPoolExecutor(max_workers=decode_threads) as pool:
+                next_index = 0
+                held = 0
+                budget = prefetch_mb * 1024 * 1024
+
+                def load_ahead(current):
+                    nonlocal next_index, held
+                    while next_index < len(items) and next_index <= current + prefetch:
+                        item = items[next_index]
+                        if item["kind"] == "image":
+                            cost = prefetch_bytes(item["path"])
+                            # one still is always let through, however large
+                            if ahead and held + cost > budget:
+                                return
+                            ahead[next_index] = (pool.submit(load_image, item["path"], next_index), cost)
+                            held += cost
+                        next_index += 1
+
+                for index, item in enumerate(items):
+                    kind, path, repeats = item["kind"], item["path"], item["repeats"]
+                    load_ahead(index)
+                    if kind == "image":
+                        print(f"Adding image {os.path.basename(path)} to the video")
+                        future, cost = ahead.pop(index)
+                        frame = future.result()
+                        held -= cost
+                        load_ahead(index + 1)
+                        stats.sample_depth("decoded", decoded)
+                        if not put(decoded, (index, "image", frame, repeats)):
+                            return
+                        continue
+                    if ingest == "ffmpeg":
+                        frames = read_video_frames_ffmpeg(path, fps, item["in"], item["out"], fit)
+                    else:
+                        frames = read_video_frames(path, fps, item["in"], item["out"])
+                    while True:
+                        start = time.perf_counter()
+                        frame = next(frames, None)
+                        stats.add_busy("decode", time.perf_counter() - start, index)
+                        if frame is None:
+                            break
+                        stats.sample_depth("decoded", decoded)
+                        if not put(decoded, (index, "video", frame, repeats)):
+                            frames.close()
+                            return
+        except BaseException as e:
+            failures.append(e)
+        finally:
+            for future, cost in ahead.values():
+                future.cancel()
+            put(decoded, None)
+
+    # enough output buffers for a full queue, the frame being queued and
+    # the frame being encoded, so a buffer is never reused while in flight
+    # only allocate buffers for the effects the plan uses
+    transitions = None
+    if any(item["transition_frames"] for item in items):
+        transitions = Transition(buffers=queue_size + 3)
+    # with transitions the overlay goes on after the blend, so the window frame
+    # stays put while slides move and dip instead of moving and dipping with them
+    overlay_stage = None
+    frame_overlay = load_overlay(overlay)
+    if transitions is not None and overlay is not None:
+        overlay_stage = Compositor(fit, buffers=queue_size + 3, overlay=frame_overlay)
+        frame_overlay = None
+    compositor = Compositor(fit, buffers=queue_size + 3, overlay=frame_overlay)
+    ken_burns = None
+    if ken_burns_zoom and any(item["kind"] == "image" for item in items):
+        # stills are placed without the overlay, the moving frames get it instead
+        still_compositor = Compositor(fit)
+        ken_burns = KenBurns(ken_burns_zoom, buffers=queue_size + 3, overlay=frame_overlay)
+
+    def frame_pieces(index, kind, frame, repeats):
+        # yields (frame, repeats), a still with motion is repeats different frames
+        if ken_burns is None or kind != "image":
+            yield compositor.compose(frame), repeats
+            return
+        still = still_compositor.compose(frame)
+        schedule = ken_burns_schedule(repeats, ken_burns.zoom, motion_seed(items[index]["path"]))
+        for rect in schedule:
+            yield ken_burns.render(rect, still), 1
+
+    def transform_stage():
+        last_index = None
+        last_frame = None
+        step = 0
+        blend_frames = 0
+        start = 0.0
+
+        def emit(index, frame, repeats):
+            nonlocal start
+            if overlay_stage is not None:
+                frame = overlay_stage.compose(frame)
+            stats.add_busy("transform", time.perf_counter() - start, index)
+            stats.sample_depth("transformed", transformed)
+            sent = put(transformed, (index, frame, repeats))
+            start = time.perf_counter()
+            return sent
+
+        try:
+            while True:
+                item = get(decoded)
+                if item is None:
+                    break
+                index, kind, frame, repeats = item
+                start = time.perf_counter()
+                if index != last_index:
+                    step = 0
+                    blend_frames = items[index]["transition_frames"] if last_frame is not None else 0
+                    if blend_frames:
+                        # the last frame is still intact, its buffer is not reused until the ring wraps
+                        transitions.begin(last_frame, items[index]["transition"], blend_frames)
+                    last_index = index
+                for frame, repeats in frame_pieces(index, kind, frame, repeats):
+                    last_frame = frame
+                    while step < blend_frames and repeats > 0:
+                        blended = transitions.render(step, frame)
+                        step += 1
+                        repeats -= 1
+                        if not emit(index, blended, 1):
+                            return
+                    if repeats and not emit(index, frame, repeats):
+                        return
+        except BaseException as e:
+            failures.append(e)
+        finally:
+            put(transformed, None)
+
+    threads = [threading.Thread(target=decode_stage, name="decode", daemon=True),
+               threading.Thread(target=transform_stage, name="transform", daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    frames_written = 0
+    try:
+        while True:
+            item = transformed.get()
+            if item is None:
+                break
+            index, frame, repeats = item
+            start = time.perf_counter()
+            if isinstance(video, MultiWriter):
+                video.write_repeated(frame, repeats)
             else:
-                image = asset
-                print(f"Adding image {image} to the video")
-                img_path = os.path.join(image_folder, image)
-                frame = cv2.imread(img_path)
-                # if the image is already 1920x1080, skip resizing and rotating
-                if not (frame.shape[0] == 1080 and frame.shape[1] == 1920):
-                    ResizeTo = (1080, 1920)
-                    frame = cv2.resize(frame, ResizeTo)
-                    #rotate 90 degree
-                    frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
-                for _ in range(fps*default_length):  # Display each image for frames
+                for _ in range(repeats):
                     video.write(frame)
+            stats.add_busy("encode", time.perf_counter() - start, index)
+            stats.assets[index]["frames"] += repeats
+            frames_written += repeats
+            progress.update(repeats, stats.assets[index]["name"])
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if failures:
+        raise failures[0]
+    stats.finish()
+    progress.report()
+    return frames_written, stats
+
+def still_clip_frames(fps, still_frames=None):
+    """
+    Number of frames in the short clip that is looped to make up a still.
+
+    Given the still's frame count the clip is shortened to divide it, so a
+    still of 1.5 seconds is three half second clips rather than one second.
+    """
+    clip_frames = max(1, int(round(fps)))
+    if still_frames:
+        clip_frames = math.gcd(clip_frames, still_frames)
+    return clip_frames
+
+def render_still_segment(frame, segment_path, fps, encoder=None, clip_frames=None):
+    """
+    Encode a still frame once as a one second clip.
+
+    The concat list repeats the clip to make up the display time, so a
+    15 second slide costs one second of encoding instead of fifteen. Variable
+    frame rate renders use a single frame clip that the concat list holds on
+    screen for the display time instead.
+    """
+    if clip_frames is None:
+        clip_frames = still_clip_frames(fps)
+    clip = open_video_writer(segment_path, fps, encoder)
+    for _ in range(clip_frames):
+        clip.write(frame)
+    clip.release()
+
+def render_ken_burns_segment(frame, segment_path, fps, encoder, frames, zoom, seed, overlay=None):
+    """Encode every frame of a still's Ken Burns move, frame being the still in output orientation."""
+    clip = open_video_writer(segment_path, fps, encoder)
+    ken_burns = KenBurns(zoom, overlay=load_overlay(overlay))
+    for rect in ken_burns_schedule(frames, zoom, seed):
+        clip.write(ken_burns.render(rect, frame))
+    clip.release()
+
+def render_video_segment(item, segment_path, fps, encoder=None, fit="stretch", overlay=None, ingest="opencv"):
+    """Render a video item of the plan into its own segment."""
+    clip = open_video_writer(segment_path, fps, encoder)
+    item = dict(item, first_frame=0, transition="cut", transition_frames=0)
+    frames_written, stats = render_frames_pipeline(clip, [item], fps, fit=fit, overlay=overlay, ingest=ingest)
+    clip.release()
+    return frames_written, stats
+
+def concat_segments(playlist, output_video):
+    """
+    Join the rendered segments into one video with the ffmpeg concat demuxer.
 
-    video.release()
+    playlist holds (segment_path, duration) pairs. The segments share codec,
+    size and fps, so the streams are copied rather than re-encoded. A duration
+    other than None sets when the next segment starts, which is how single
+    frame stills are held on screen in variable frame rate output.
+    """
+    list_path = os.path.splitext(output_video)[0] + "_concat.txt"
+    with open(list_path, "w", encoding="utf-8") as concat_list:
+        for segment_path, duration in playlist:
+            escaped = os.path.abspath(segment_path).replace("'", "'\\''")
+            concat_list.write(f"file '{escaped}'\n")
+            if duration is not None:
+                concat_list.write(f"duration {duration}\n")
+    subprocess.run(["ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                    "-f", "concat", "-safe", "0", "-i", list_path,
+                    "-c", "copy", output_video], check=True)
+    os.remove(list_path)
+
+def file_content_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as asset_file:
+        for chunk in iter(lambda: asset_file.read(1024 * 1024), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def segment_key(content_hash, kind, fps, length, encoder=None, settings=None):
+    """
+    Name of the segment rendered from an asset's content with the given settings.
+
+    settings holds any other render options that change the segment's frames.
+    """
+    key = f"{content_hash}|{kind}|{fps}|{length}|{json.dumps(encoder, sort_keys=True)}|{json.dumps(settings, sort_keys=True)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def manifest_path_for(output_video):
+    return os.path.splitext(output_video)[0] + ".json"
+
+def load_latest_manifest(output_folder):
+    """Return the manifest written by the most recent render in the output folder, if any."""
+    if not os.path.isdir(output_folder):
+        return None
+    manifests = [os.path.join(output_folder, name) for name in os.listdir(output_folder)
+                 if name.startswith("window_gen_") and name.endswith(".json")]
+    if not manifests:
+        return None
+    latest = max(manifests, key=os.path.getmtime)
+    try:
+        with open(latest, encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {latest}: {e}")
+        return None
+
+def render_asset_segment(item, segment_path, fps, cache_folder=None, cache_limit_mb=1024, encoder=None, clip_frames=None, fit="stretch", overlay=None, ken_burns_zoom=None, ingest="opencv"):
+    """
+    Render one item of the plan into its segment file.
+
+    Returns the number of frames written and the seconds spent on it per
+    stage. Runs in a worker process when rendering with several jobs, so it
+    only takes plain arguments.
+
+    The segment is written under a partial name and renamed into place once
+    its writer is closed, so an interrupted render never leaves a truncated
+    segment that later runs would reuse.
+    """
+    final_path = segment_path
+    segment_path = final_path + ".partial.mp4"
+    try:
+        frames, timings = render_segment_file(item, segment_path, fps, cache_folder=cache_folder, cache_limit_mb=cache_limit_mb,
+                                              encoder=encoder, clip_frames=clip_frames, fit=fit, overlay=overlay,
+                                              ken_burns_zoom=ken_burns_zoom, ingest=ingest)
+    except BaseException:
+        if os.path.exists(segment_path):
+            os.remove(segment_path)
+        raise
+    os.replace(segment_path, final_path)
+    return frames, timings
+
+def render_segment_file(item, segment_path, fps, cache_folder=None, cache_limit_mb=1024, encoder=None, clip_frames=None, fit="stretch", overlay=None, ken_burns_zoom=None, ingest="opencv"):
+    started = time.perf_counter()
+    asset_path = item["path"]
+    if item["kind"] == "video":
+        frames, stats = render_video_segment(item, segment_path, fps, encoder=encoder, fit=fit, overlay=overlay, ingest=ingest)
+        timings = dict(stats.busy)
+    else:
+        print(f"Adding image {os.path.basename(asset_path)} to the video")
+        frame = load_normalized_image(asset_path, cache_folder, cache_limit_mb, fit)
+        if ken_burns_zoom:
+            loaded = time.perf_counter()
+            render_ken_burns_segment(frame, segment_path, fps, encoder, clip_frames, ken_burns_zoom, motion_seed(asset_path), overlay)
+        else:
+            if overlay is not None:
+                # cached frames stay overlay free so changing the overlay keeps the cache
+                frame = Compositor(fit, overlay=load_overlay(overlay)).compose(frame)
+            loaded = time.perf_counter()
+            render_still_segment(frame, segment_path, fps, encoder, clip_frames)
+        frames = clip_frames or still_clip_frames(fps)
+        # the frame cache decodes and normalizes in one step
+        timings = {"decode": loaded - started, "transform": 0.0, "encode": time.perf_counter() - loaded}
+    timings["seconds"] = time.perf_counter() - started
+    return frames, timings
+
+def create_video_from_segments(plan, output_video, fps, default_length, cache_folder=None, cache_limit_mb=1024, rebuild=False, jobs=1, encoder=None, vfr=False, fit="stretch", overlay=None, ken_burns_zoom=None, ingest="opencv"):
+    """
+    Render each asset once into its own segment and join them by stream copy.
+
+    plan comes from plan_schedule(). Stills are encoded as a short clip that
+    the concat list repeats for the display time, and every loop of the plan
+    reuses the segments of the first.
+
+    Segments are kept in a segments folder next to the output, named after the
+    asset's content hash and render settings, and a manifest is written next
+    to the output video. The next run only renders segments whose inputs
+    changed unless rebuild is set. With jobs above one the segments are
+    rendered in a process pool and joined in playlist order afterwards.
+
+    With vfr each still is a single frame shown for its duration, giving a
+    variable frame rate output.
+
+    An overlay (path, opacity, key) is blended onto every segment and its content
+    hash is part of the segment names, so editing the template re-renders.
+
+    With ken_burns_zoom each still is rendered in full as its zoom and pan,
+    so the worker processes share the motion frames out a still at a time.
+    """
+    started = time.perf_counter()
+    output_folder = os.path.dirname(output_video)
+    segment_folder = os.path.join(output_folder, "segments")
+    os.makedirs(segment_folder, exist_ok=True)
+
+    previous = load_latest_manifest(output_folder) or {}
+    previous_assets = {entry["path"]: entry for entry in previous.get("assets", [])}
+
+    settings = {"fit": fit}
+    if overlay is not None:
+        settings["overlay"] = [file_content_hash(overlay[0])] + list(overlay[1:])
+
+    loop_count = plan["loop_count"]
+    items = [item for item in plan["items"] if item["loop"] == 0]
+    manifest_assets = []
+    clip_lengths = []
+    playlist = []
+    to_render = []
+    timings = {}
+    for item in items:
+        kind = item["kind"]
+        asset = item["name"]
+        asset_path = os.path.abspath(item["path"])
+        stat = os.stat(asset_path)
+
+        # only re-hash assets whose size or modification time changed
+        known = previous_assets.get(asset_path)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            content_hash = known["sha1"]
+        else:
+            content_hash = file_content_hash(asset_path)
+
+        clip_frames = None
+        asset_settings = settings
+        if kind == "image":
+            clip_frames = 1 if vfr else still_clip_frames(fps, item["repeats"])
+            if ken_burns_zoom:
+                clip_frames = item["repeats"]
+                asset_settings = dict(settings, ken_burns=[ken_burns_zoom, motion_seed(asset_path)])
+        else:
+            if item["in"] is not None or item["out"] is not None:
+                asset_settings = dict(settings, cut=[item["in"], item["out"]])
+            if ingest != "opencv":
+                asset_settings = dict(asset_settings, ingest=ingest)
+        length = clip_frames
+        segment_name = segment_key(content_hash, kind, fps, length, encoder, asset_settings) + ".mp4"
+        segment_path = os.path.join(segment_folder, segment_name)
+        frames = None
+        if not rebuild and os.path.exists(segment_path):
+            print(f"Reusing segment for {asset}")
+            if known and known["segment"] == segment_name:
+                frames = known["frames"]
+        else:
+            to_render.append((len(manifest_assets), dict(item, path=asset_path), segment_path, clip_frames))
+
+        manifest_assets.append({
+            "name": asset,
+            "path": asset_path,
+            "kind": kind,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha1": content_hash,
+            "frames": frames,
+            "segment": segment_name,
+        })
+        clip_lengths.append(clip_frames)
+
+    segment_settings = dict(cache_folder=cache_folder, cache_limit_mb=cache_limit_mb, encoder=encoder,
+                            fit=fit, overlay=overlay, ken_burns_zoom=ken_burns_zoom, ingest=ingest)
+    if jobs > 1 and len(to_render) > 1:
+        print(f"Rendering {len(to_render)} segments with {jobs} worker processes")
+        # one OpenCV thread per worker so the processes do not oversubscribe the cores
+        with ProcessPoolExecutor(max_workers=jobs, initializer=cv2.setNumThreads, initargs=(1,)) as pool:
+            futures = [(index, pool.submit(render_asset_segment, item, segment_path, fps,
+                                               clip_frames=clip_frames, **segment_settings))
+                       for index, item, segment_path, clip_frames in to_render]
+            for index, future in futures:
+                manifest_assets[index]["frames"], timings[index] = future.result()
+    else:
+        for index, item, segment_path, clip_frames in to_render:
+            manifest_assets[index]["frames"], timings[index] = render_asset_segment(
+                item, segment_path, fps, clip_frames=clip_frames, **segment_settings)
+
+    # assemble the playlist in order once every segment exists
+    for entry, item, clip_frames in zip(manifest_assets, items, clip_lengths):
+        segment_path = os.path.join(segment_folder, entry["segment"])
+        if entry["kind"] == "image" and vfr:
+            playlist.append((segment_path, item["duration"]))
+            entry["frames"] = 1
+            entry["duration"] = item["duration"]
+            continue
+        if entry["kind"] == "image":
+            repeats = max(1, item["repeats"] // clip_frames)
+            playlist.extend([(segment_path, None)] * repeats)
+            entry["frames"] = repeats * clip_frames
+        else:
+            playlist.append((segment_path, None))
+            if entry["frames"] is None:
+                cap = cv2.VideoCapture(segment_path)
+                entry["frames"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                cap.release()
+        entry["duration"] = entry["frames"] / fps
+
+    playlist = playlist * loop_count
+    if vfr and playlist[-1][1] is not None:
+        # a frame only lasts until the next one starts, so repeat the last
+        # still briefly to keep it on screen for its full display time
+        playlist.append((playlist[-1][0], 1 / fps))
+
+    print(f"Rendered {len(to_render)} of {len(items)} segments, joining them")
+    concat_started = time.perf_counter()
+    concat_segments(playlist, output_video)
+    concat_seconds = time.perf_counter() - concat_started
+
+    manifest = {
+        "output": os.path.basename(output_video),
+        "fps": fps,
+        "vfr": vfr,
+        "fit": fit,
+        "ken_burns_zoom": ken_burns_zoom,
+        "overlay": {"path": os.path.abspath(overlay[0]), "opacity": overlay[1], "key": overlay[2]} if overlay else None,
+        "default_length": default_length,
+        "loop_count": loop_count,
+        "assets": manifest_assets,
+    }
+    with open(manifest_path_for(output_video), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    # drop segments that are no longer part of the playlist
+    in_use = {entry["segment"] for entry in manifest_assets}
+    for name in os.listdir(segment_folder):
+        if name not in in_use:
+            os.remove(os.path.join(segment_folder, name))
     print(f"Video saved as {output_video}")
 
+    stages = {"decode": 0.0, "transform": 0.0, "encode": 0.0}
+    asset_stats = []
+    for index, entry in enumerate(manifest_assets):
+        timing = timings.get(index, {})
+        for stage in stages:
+            stages[stage] += timing.get(stage, 0.0)
+        asset_stats.append(dict({"name": entry["name"], "kind": entry["kind"], "frames": entry["frames"],
+                                 "reused": index not in timings}, **timing))
+    stages["concat"] = concat_seconds
+    total_frames = sum(entry["frames"] for entry in manifest_assets) * loop_count
+    return stats_report("segments", output_video, fps, total_frames, time.perf_counter() - started,
+                        stages, asset_stats, duration=sum(entry["duration"] for entry in manifest_assets) * loop_count,
+                        jobs=jobs, rendered=len(to_render), vfr=vfr,
+                        encoder=encoder["codec"] if encoder else "opencv", ingest=ingest)
+
+def publish_live(output_video, videos):
+    """
+    Move a finished render onto the stable live names by atomic replace.
+
+    videos are output_video and the videos saved alongside it, each moved to
+    LIVE_NAME with the same ending, so window_gen_<date>_foyer.mp4 becomes
+    window_live_foyer.mp4. A player showing the live file keeps the old one
+    open until it reopens the name. Where the file cannot be replaced while
+    it is playing, as on Windows, the dated render is kept instead.
+    """
+    stem = os.path.splitext(output_video)[0]
+    live_stem = os.path.join(os.path.dirname(output_video), LIVE_NAME)
+    for video in videos:
+        live_video = live_stem + video[len(stem):]
+        try:
+            os.replace(video, live_video)
+            print(f"Published {os.path.basename(video)} as {live_video}")
+        except OSError as e:
+            print(f"Could not replace {live_video}, keeping {video}: {e}")
+
 def generate_datestamp():
     return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 
-def rotate_video(input_video):
-        output_video = input_video.replace(".mp4", "_rotated.mp4")
-        os.system(f'ffmpeg -i {input_video} -vf "transpose=2" {output_video}')
-        print(f"Rotated video saved as {output_video}")
+def rotate_video(input_video, mode="transpose"):
+    """
+    Save a copy of a video turned 90 degrees anticlockwise as _rotated.mp4.
+
+    mode "metadata" copies the streams and only sets the rotation in the
+    display matrix, which takes seconds but relies on the player honouring
+    it. ffmpeg 6 and later set it with -display_rotation, older versions from
+    the rotate tag. "transpose" re-encodes every frame turned, which any
+    player shows the right way up, and is the fallback when ffmpeg can set
+    neither.
+    """
+    output_video = os.path.splitext(input_video)[0] + "_rotated.mp4"
+    ffmpeg = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"]
+    if mode == "metadata":
+        attempts = [
+            ffmpeg + ["-display_rotation:v:0", "90", "-i", input_video, "-c", "copy", output_video],
+            # the rotate tag is clockwise, 270 is the same quarter turn anticlockwise
+            ffmpeg + ["-i", input_video, "-c", "copy", "-metadata:s:v:0", "rotate=270", output_video],
+        ]
+        for command in attempts:
+            if subprocess.run(command, capture_output=True).returncode == 0:
+                print(f"Rotated video saved as {output_video}, turned by its display matrix")
+                return output_video
+        print("ffmpeg could not set the display rotation, re-encoding the video turned instead")
+    subprocess.run(ffmpeg + ["-i", input_video, "-vf", "transpose=2", "-c:a", "copy", output_video], check=True)
+    print(f"Rotated video saved as {output_video}")
+    return output_video
 
 if __name__ == "__main__":
     
@@ -100,6 +1458,37 @@ if __name__ == "__main__":
     video_folder = "videos"
     output_folder = "output"
     randomise = False
+    segments = False
+    cache_folder = "cache"
+    cache_limit_mb = 1024
+    rebuild = False
+    jobs = 1
+    codec = "libx264"
+    preset = "veryfast"
+    crf = 23
+    gop_seconds = 10
+    vfr = False
+    decode_threads = 2
+    queue_size = FRAME_QUEUE_SIZE
+    stats_file = None
+    fit = "stretch"
+    overlay = None
+    overlay_opacity = 1.0
+    overlay_key = None
+    transition = "cut"
+    transition_seconds = 1.0
+    ken_burns_zoom = None
+    playlist = None
+    plan_only = False
+    rotate = None
+    ingest = "opencv"
+    targets = []
+    watch = False
+    watch_interval = 1.0
+    debounce = 2.0
+    chunk_seconds = None
+    prefetch = PREFETCH_ASSETS
+    prefetch_mb = PREFETCH_MB
     fps=10
     parser = argparse.ArgumentParser(
                     prog='Create Window Video Application',
@@ -108,8 +1497,41 @@ if __name__ == "__main__":
     
     parser.add_argument('-i', '--images', help='Path to the folder containing images', required=False)
     parser.add_argument('-o', '--output', help='Path to the output folder', required=False)
+    parser.add_argument('-p', '--playlist', help='JSON or YAML playlist of assets with their durations, in and out points, transitions and loop count, instead of the image and video folders', required=False)
     parser.add_argument('-r', '--randomise', help='Randomise the order of images', action='store_true', required=False)
     parser.add_argument('-f', '--fps', help='Frames per second', required=False)
+    parser.add_argument('-s', '--segments', help='Render each asset once as a segment and join them with ffmpeg', action='store_true', required=False)
+    parser.add_argument('--cache', help='Folder for the normalized frame cache (default: cache)', required=False)
+    parser.add_argument('--cache-size', help='Frame cache size limit in MB (default: 1024)', required=False)
+    parser.add_argument('--no-cache', help='Do not cache normalized frames', action='store_true', required=False)
+    parser.add_argument('--rebuild', help='Re-render every segment instead of reusing unchanged ones', action='store_true', required=False)
+    parser.add_argument('-j', '--jobs', help='Render segments in N worker processes (implies --segments)', required=False)
+    parser.add_argument('-e', '--encoder', help='Video encoder: libx264, libx265 or opencv for the OpenCV mp4v writer (default: libx264)', choices=['libx264', 'libx265', 'opencv'], required=False)
+    parser.add_argument('--preset', help='ffmpeg encoder preset, e.g. ultrafast, veryfast, medium, slow (default: veryfast)', required=False)
+    parser.add_argument('--crf', help='ffmpeg constant rate factor, lower is better quality (default: 23)', required=False)
+    parser.add_argument('--gop', help='Seconds between keyframes (default: 10)', required=False)
+    parser.add_argument('--decode-threads', help='Threads loading stills ahead of the encoder (default: 2)', required=False)
+    parser.add_argument('--prefetch', help=f'Assets ahead of the encoder that stills are loaded and normalized (default: {PREFETCH_ASSETS})', required=False)
+    parser.add_argument('--prefetch-mb', help=f'Memory the stills loaded ahead may hold in MB (default: {PREFETCH_MB})', required=False)
+    parser.add_argument('--queue-size', help=f'Frames held between pipeline stages (default: {FRAME_QUEUE_SIZE})', required=False)
+    parser.add_argument('--fit', help='How assets are placed on the window: stretch (default), letterbox, blur or crop', choices=FIT_MODES, required=False)
+    parser.add_argument('--overlay', help='Image blended over every frame, such as a window frame or logo; transparent where its alpha channel is', required=False)
+    parser.add_argument('--overlay-opacity', help='Opacity of the overlay from 0 to 1 (default: 1)', required=False)
+    parser.add_argument('--overlay-key', help='For an overlay without transparency, the colour of its holes as #RRGGBB or R,G,B, e.g. #ffdc97; the slide shows wherever the overlay is that colour', required=False)
+    parser.add_argument('-t', '--transition', help='Transition between assets: cut (default), crossfade, dip or slide', choices=TRANSITIONS, required=False)
+    parser.add_argument('--transition-length', help='Seconds each transition takes from the start of the next asset (default: 1)', required=False)
+    parser.add_argument('-k', '--ken-burns', help='Slowly zoom and pan across each still', action='store_true', required=False)
+    parser.add_argument('--zoom', help='How far Ken Burns stills zoom in, e.g. 1.1 for 10%% (default: 1.1)', required=False)
+    parser.add_argument('--plan', help='List the assets, their sizes and frame counts and the estimated encode cost from file headers, without rendering', action='store_true', required=False)
+    parser.add_argument('--rotate', help='Also save a copy turned 90 degrees anticlockwise: metadata sets the display rotation without re-encoding, transpose re-encodes it for players that ignore that', choices=['metadata', 'transpose'], required=False)
+    parser.add_argument('--ingest', help='How videos are read: opencv (default) decodes full frames, ffmpeg scales, rotates and drops frames inside ffmpeg, faster for large videos', choices=['opencv', 'ffmpeg'], required=False)
+    parser.add_argument('--targets', nargs='+', metavar='TARGET', help=f'Also render the playlist for other screens in the same pass: {", ".join(OUTPUT_TARGETS)} or a WIDTHxHEIGHT size, each saved next to the window video with its name added', required=False)
+    parser.add_argument('--chunk-length', help='Render frame by frame in chunks of about this many seconds with a checkpoint, so an interrupted render carries on from the first missing chunk when run again', required=False)
+    parser.add_argument('--watch', help=f'Keep running and render again whenever assets are added, changed or removed, reusing the segments of unchanged assets (implies --segments); each render replaces {LIVE_NAME}.mp4 in the output folder', action='store_true', required=False)
+    parser.add_argument('--watch-interval', help='Seconds between checks of the asset folders in --watch mode (default: 1)', required=False)
+    parser.add_argument('--debounce', help='Seconds the assets must stay unchanged before --watch renders, so a batch of files is rendered once (default: 2)', required=False)
+    parser.add_argument('--stats', help='Write a JSON report of render timings and memory use to this file', required=False)
+    parser.add_argument('--vfr', help='Variable frame rate output: each still is one frame held for its display time (implies --segments)', action='store_true', required=False)
     args = parser.parse_args()
 
     if args.images:
@@ -120,9 +1542,147 @@ if __name__ == "__main__":
         fps = float(args.fps)
     if args.randomise:
         randomise = True
+    if args.segments:
+        segments = True
+    if args.cache:
+        cache_folder = args.cache
+    if args.cache_size:
+        cache_limit_mb = float(args.cache_size)
+    if args.no_cache:
+        cache_folder = None
+    if args.rebuild:
+        rebuild = True
+    if args.jobs:
+        jobs = int(args.jobs)
+        segments = True
+    if args.encoder:
+        codec = args.encoder
+    if args.preset:
+        preset = args.preset
+    if args.crf:
+        crf = int(args.crf)
+    if args.gop:
+        gop_seconds = float(args.gop)
+    if args.decode_threads:
+        decode_threads = int(args.decode_threads)
+    if args.queue_size:
+        queue_size = int(args.queue_size)
+    if args.prefetch:
+        prefetch = max(1, int(args.prefetch))
+    if args.prefetch_mb:
+        prefetch_mb = float(args.prefetch_mb)
+    if args.fit:
+        fit = args.fit
+    if args.overlay_opacity:
+        try:
+            overlay_opacity = float(args.overlay_opacity)
+        except ValueError:
+            parser.error(f"--overlay-opacity must be a number from 0 to 1, got {args.overlay_opacity}")
+        # a uint8 alpha would wrap around outside this range
+        if not 0 <= overlay_opacity <= 1:
+            parser.error(f"--overlay-opacity must be from 0 to 1, got {args.overlay_opacity}")
+    if args.overlay:
+        if not os.path.isfile(args.overlay):
+            parser.error(f"overlay {args.overlay} not found")
+        if args.overlay_key:
+            try:
+                overlay_key = parse_key_colour(args.overlay_key)
+            except ValueError as e:
+                parser.error(str(e))
+        overlay = (args.overlay, overlay_opacity, overlay_key)
+        try:
+            load_overlay(overlay)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.transition:
+        transition = args.transition
+    if args.transition_length:
+        transition_seconds = float(args.transition_length)
+    if args.ken_burns:
+        ken_burns_zoom = 1.1
+        if args.zoom:
+            try:
+                ken_burns_zoom = float(args.zoom)
+            except ValueError:
+                parser.error(f"--zoom must be a number of at least 1, got {args.zoom}")
+            # below 1 the crop would be larger than the still
+            if ken_burns_zoom < 1:
+                parser.error(f"--zoom must be at least 1, got {args.zoom}")
+    if args.playlist:
+        try:
+            playlist = load_playlist(args.playlist)
+        except (OSError, ValueError) as e:
+            parser.error(f"could not read playlist {args.playlist}: {e}")
+    if args.plan:
+        plan_only = True
+    if args.rotate:
+        rotate = args.rotate
+    if args.ingest:
+        ingest = args.ingest
+    if ingest == "ffmpeg" and not shutil.which("ffmpeg"):
+        print("ffmpeg not found on PATH, reading videos with OpenCV")
+        ingest = "opencv"
+    if args.targets:
+        try:
+            targets = [parse_target(target) for target in dict.fromkeys(args.targets)]
+        except ValueError as e:
+            parser.error(str(e))
+    if args.chunk_length:
+        chunk_seconds = float(args.chunk_length)
+    if args.watch:
+        watch = True
+        # unchanged assets keep their segments, so a render only encodes what changed
+        segments = True
+    if args.watch_interval:
+        watch_interval = float(args.watch_interval)
+    if args.debounce:
+        debounce = float(args.debounce)
+    if args.stats:
+        stats_file = args.stats
+    if args.vfr:
+        vfr = True
+        segments = True
+    encoder = make_encoder(codec, preset, crf, gop_seconds)
+
+
+    if not plan_only:
+        os.makedirs(output_folder, exist_ok=True)
 
+    def render(playlist):
+        datestamp = generate_datestamp()
+        output_video = os.path.join(output_folder, f"window_gen_{datestamp}.mp4")
+        # Original aspect ratio: 9:16, will output as -90 rotated 16:9
+        report = create_video_from_images(
+            image_folder, video_folder, output_video, fps=fps, randomise=randomise, segments=segments,
+            cache_folder=cache_folder, cache_limit_mb=cache_limit_mb, rebuild=rebuild, jobs=jobs, encoder=encoder,
+            vfr=vfr, decode_threads=decode_threads, queue_size=queue_size, fit=fit, overlay=overlay,
+            transition=transition, transition_seconds=transition_seconds, ken_burns_zoom=ken_burns_zoom,
+            playlist=playlist, plan_only=plan_only, ingest=ingest, targets=targets, chunk_seconds=chunk_seconds,
+            prefetch=prefetch, prefetch_mb=prefetch_mb)
+        if stats_file and report:
+            with open(stats_file, "w", encoding="utf-8") as stats_output:
+                json.dump(report, stats_output, indent=2)
+            print(f"Render stats saved as {stats_file}")
+        if rotate and report:
+            rotate_video(output_video, rotate)
+        if watch and report and not plan_only:
+            # one file per screen that each render replaces, rather than a new dated file
+            videos = [output_video] + [target_path(output_video, name) for name, size in targets]
+            if rotate:
+                videos.append(os.path.splitext(output_video)[0] + "_rotated.mp4")
+            publish_live(output_video, [video for video in videos if os.path.exists(video)])
 
-    datestamp = generate_datestamp()
-    output_video = os.path.join(output_folder, f"window_gen_{datestamp}.mp4")
-    # Original aspect ratio: 9:16, will output as -90 rotated 16:9
-    create_video_from_images(image_folder, video_folder, output_video, fps, randomise)
+    if watch:
+        if playlist:
+            # the playlist file itself and every folder its assets come from
+            watched = [args.playlist] + sorted({os.path.dirname(item["path"]) for item in playlist["items"]})
+        else:
+            watched = [folder for folder in (image_folder, video_folder) if os.path.isdir(folder)]
+        # taken before the first render, so files that land while it runs are rendered next
+        snapshot = folder_snapshot(watched)
+    render(playlist)
+    if watch:
+        # a rebuild only applies to the first render, later ones reuse what it made
+        rebuild = False
+        # the playlist is read again in case it was edited as well
+        watch_folders(watched, lambda: render(load_playlist(args.playlist) if args.playlist else None), watch_interval, debounce, snapshot)
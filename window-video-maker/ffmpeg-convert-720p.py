@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import cv2
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".mkv", ".avi")
+
+# create-window.py's working folders and files next to its renders, not renders themselves
+WORK_FOLDERS = ("segments", "chunks")
+WORK_SUFFIXES = ("_pass.mp4", ".partial.mp4")
+
+# remembers the source of every output so touched but unchanged files are skipped
+STATE_FILE = ".convert-720p.json"
+
+# the short side becomes 720 pixels, or stays as it is for smaller videos
+SCALE_FILTER = "scale=w='if(gt(iw,ih),-2,min({height},iw))':h='if(gt(iw,ih),min({height},ih),-2)'"
+
+def find_videos(input_folder, output_folder, recursive=False):
+    """
+    Relative paths of the videos in input_folder, and in its subfolders when recursive.
+
+    The output folder and create-window.py's segments, chunks and partial
+    files are left out, so cached clips are not converted as if they were renders.
+    """
+    output_folder = os.path.abspath(output_folder)
+    videos = []
+    for folder, subfolders, files in os.walk(input_folder):
+        subfolders[:] = sorted(name for name in subfolders
+                               if recursive and name not in WORK_FOLDERS
+                               and os.path.abspath(os.path.join(folder, name)) != output_folder)
+        for name in sorted(files):
+            if name.lower().endswith(VIDEO_EXTENSIONS) and not name.startswith(".") and not name.endswith(WORK_SUFFIXES):
+                videos.append(os.path.relpath(os.path.join(folder, name), input_folder))
+    return videos
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as video_file:
+        for chunk in iter(lambda: video_file.read(1024 * 1024), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def video_seconds(path):
+    """Length of a video from its header, 0 when it cannot be read."""
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return frames / fps if fps > 0 and frames > 0 else 0.0
+    finally:
+        cap.release()
+
+def is_up_to_date(source, output, record, settings):
+    """
+    Whether output is a finished conversion of source with these settings.
+
+    An output newer than its source is up to date. A source that was
+    touched since is only hashed, and counts as unchanged when the hash
+    matches the one recorded at its last conversion.
+    """
+    if not os.path.exists(output) or not record or record.get("settings") != settings:
+        return False, None
+    if os.path.getmtime(output) >= os.path.getmtime(source):
+        return True, None
+    content_hash = file_hash(source)
+    return content_hash == record.get("sha1"), content_hash
+
+def convert(source, output, settings, threads):
+    """Transcode one video to 720p, copying its audio when the mp4 container allows it."""
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    # write next to the output and rename, so an interrupted run never leaves
+    # a partial file that looks up to date
+    partial = output + ".partial.mp4"
+    command = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-i", source,
+               "-map", "0:v:0", "-map", "0:a?", "-vf", SCALE_FILTER.format(height=settings["height"]),
+               "-c:v", "libx264", "-preset", settings["preset"], "-crf", str(settings["crf"]),
+               "-pix_fmt", "yuv420p", "-threads", str(threads), "-movflags", "+faststart"]
+    result = subprocess.run(command + ["-c:a", "copy", partial], capture_output=True, text=True)
+    audio = "copied"
+    if result.returncode != 0:
+        # audio codecs mp4 cannot hold are re-encoded instead
+        result = subprocess.run(command + ["-c:a", "aac", "-b:a", "160k", partial], capture_output=True, text=True)
+        audio = "re-encoded"
+    if result.returncode != 0:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"ffmpeg exit code {result.returncode}")
+    os.replace(partial, output)
+    return audio
+
+def convert_folder(input_folder, output_folder, jobs=2, height=720, crf=23, preset="veryfast", force=False, recursive=False):
+    """Convert every video under input_folder into output_folder and print a throughput summary."""
+    settings = {"height": height, "crf": crf, "preset": preset}
+    state_path = os.path.join(output_folder, STATE_FILE)
+    state = {}
+    if os.path.exists(state_path):
+        try:
+            with open(state_path, encoding="utf-8") as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable {state_path}: {e}")
+
+    videos = find_videos(input_folder, output_folder, recursive)
+    if not videos:
+        print(f"No videos found in {input_folder}")
+        return
+    print(f"Found {len(videos)} videos in {input_folder}")
+
+    to_convert = []
+    skipped = 0
+    for video in videos:
+        source = os.path.join(input_folder, video)
+        output = os.path.join(output_folder, os.path.splitext(video)[0] + ".mp4")
+        up_to_date, content_hash = (False, None) if force else is_up_to_date(source, output, state.get(video), settings)
+        if up_to_date:
+            skipped += 1
+            if content_hash:
+                # the source was only touched, bring the output's mtime past it
+                os.utime(output)
+            continue
+        to_convert.append((video, source, output))
+
+    # ffmpeg threads each encode, so split the cores between the workers
+    threads = max(1, (os.cpu_count() or 1) // jobs)
+    print(f"Converting {len(to_convert)} videos with {jobs} workers, skipping {skipped} that are up to date")
+    started = time.perf_counter()
+    totals = {"converted": 0, "failed": 0, "seconds": 0.0, "input_bytes": 0, "output_bytes": 0}
+
+    def run(video, source, output):
+        job_started = time.perf_counter()
+        audio = convert(source, output, settings, threads)
+        return audio, time.perf_counter() - job_started
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run, video, source, output): (video, source, output) for video, source, output in to_convert}
+        for future in as_completed(futures):
+            video, source, output = futures[future]
+            try:
+                audio, seconds = future.result()
+            except (RuntimeError, OSError) as e:
+                totals["failed"] += 1
+                print(f"Failed {video}: {e}")
+                continue
+            length = video_seconds(source)
+            totals["converted"] += 1
+            totals["seconds"] += length
+            totals["input_bytes"] += os.path.getsize(source)
+            totals["output_bytes"] += os.path.getsize(output)
+            state[video] = {"sha1": file_hash(source), "settings": settings}
+            speed = f", {length / seconds:.1f}x realtime" if seconds and length else ""
+            print(f"Converted {video} in {seconds:.1f}s{speed}, audio {audio}")
+
+    if to_convert:
+        os.makedirs(output_folder, exist_ok=True)
+        with open(state_path, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file, indent=2)
+
+    elapsed = time.perf_counter() - started
+    print(f"{totals['converted']} converted, {skipped} up to date, {totals['failed']} failed in {elapsed:.1f}s")
+    if totals["converted"] and elapsed:
+        print(f"Throughput: {totals['seconds'] / elapsed:.1f}x realtime, {totals['converted'] / elapsed * 60:.1f} videos a minute, "
+              f"{totals['input_bytes'] / elapsed / 1e6:.1f} MB/s read, "
+              f"{totals['input_bytes'] / 1e6:.1f} MB in, {totals['output_bytes'] / 1e6:.1f} MB out")
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='Convert to 720p',
+                    description='Transcode every video in a folder to 720p for the foyer screen',
+                    epilog='')
+    parser.add_argument('input_folder', nargs='?', default='output', help='Folder of videos to convert (default: output)')
+    parser.add_argument('-o', '--output', help='Folder for the 720p videos (default: 720p inside the input folder)', required=False)
+    parser.add_argument('-j', '--jobs', type=int, default=2, help='Videos converted at once (default: 2)')
+    parser.add_argument('--height', type=int, default=720, help='Short side of the output in pixels (default: 720)')
+    parser.add_argument('--crf', type=int, default=23, help='x264 constant rate factor, lower is better quality (default: 23)')
+    parser.add_argument('--preset', default='veryfast', help='x264 preset (default: veryfast)')
+    parser.add_argument('-r', '--recursive', action='store_true', help='Also convert the videos in subfolders of the input folder')
+    parser.add_argument('--force', action='store_true', help='Convert every video even when its output is up to date')
+    args = parser.parse_args()
+
+    if not shutil.which("ffmpeg"):
+        sys.exit("ffmpeg not found on PATH")
+    if not os.path.isdir(args.input_folder):
+        sys.exit(f"Input folder {args.input_folder} not found")
+    output_folder = args.output or os.path.join(args.input_folder, "720p")
+    convert_folder(args.input_folder, output_folder, max(1, args.jobs), args.height, args.crf, args.preset, args.force, args.recursive)
@@ -0,0 +1,236 @@
+"""
+Tests for the window video maker, run with python -m pytest or python -m unittest.
+
+The assets are generated into a temporary folder, so nothing outside it is
+read or written. The segment tests need ffmpeg on the PATH and are skipped
+without it.
+"""
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from window_compositor import CANVAS_SIZE, OUTPUT_SIZE, Overlay
+from window_playlist import kept_video_frames, load_playlist, make_entry, plan_schedule
+
+def load_create_window():
+    """create-window.py as a module, registered so worker processes can find its functions."""
+    spec = importlib.util.spec_from_file_location("create_window", os.path.join(HERE, "create-window.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["create_window"] = module
+    spec.loader.exec_module(module)
+    return module
+
+create_window = load_create_window()
+
+def write_poster(path, seed, size=CANVAS_SIZE):
+    """A portrait still with a few blocks of colour, different for every seed."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    image = np.full((height, width, 3), rng.integers(0, 256, 3), dtype=np.uint8)
+    for _ in range(6):
+        x, y = int(rng.integers(0, width - 100)), int(rng.integers(0, height - 100))
+        image[y:y + 100, x:x + 100] = rng.integers(0, 256, 3)
+    cv2.imwrite(path, image)
+
+def write_clip(path, fps=10, frames=25, size=(320, 240)):
+    """A short mp4v clip whose frames each carry their index as brightness."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for index in range(frames):
+        writer.write(np.full((size[1], size[0], 3), index * 9 % 256, dtype=np.uint8))
+    writer.release()
+
+def read_all_frames(video_path):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+class WorkFolderTest(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp(prefix="window-test-")
+        self.addCleanup(shutil.rmtree, self.work, True)
+
+    def path(self, *parts):
+        return os.path.join(self.work, *parts)
+
+class ChunkRangesTest(unittest.TestCase):
+    def items(self, *frames_and_transitions):
+        return [{"frames": frames, "transition_frames": transition} for frames, transition in frames_and_transitions]
+
+    def test_splits_between_items_once_long_enough(self):
+        items = self.items((10, 0), (10, 0), (10, 0), (10, 0), (10, 0))
+        self.assertEqual(create_window.chunk_ranges(items, 10, 2), [(0, 2), (2, 4), (4, 5)])
+
+    def test_never_splits_into_a_transition(self):
+        items = self.items((20, 0), (20, 5), (20, 5), (20, 0))
+        self.assertEqual(create_window.chunk_ranges(items, 10, 1), [(0, 3), (3, 4)])
+
+    def test_no_items(self):
+        self.assertEqual(create_window.chunk_ranges([], 10, 1), [])
+
+class StillClipFramesTest(unittest.TestCase):
+    def test_one_second_clip(self):
+        self.assertEqual(create_window.still_clip_frames(10), 10)
+
+    def test_clip_divides_the_still(self):
+        self.assertEqual(create_window.still_clip_frames(10, 15), 5)
+        self.assertEqual(create_window.still_clip_frames(10, 150), 10)
+
+    def test_at_least_one_frame(self):
+        self.assertEqual(create_window.still_clip_frames(0.1), 1)
+
+class ParseTargetTest(unittest.TestCase):
+    def test_named_target(self):
+        self.assertEqual(create_window.parse_target("portrait"), ("portrait", CANVAS_SIZE))
+
+    def test_size_target(self):
+        self.assertEqual(create_window.parse_target("640X360"), ("640x360", (640, 360)))
+
+    def test_rejects_odd_and_unknown_sizes(self):
+        for target in ("641x360", "lobby", "640x", "0x0"):
+            with self.assertRaises(ValueError):
+                create_window.parse_target(target)
+
+class ParseKeyColourTest(unittest.TestCase):
+    def test_hex_and_rgb_give_bgr(self):
+        self.assertEqual(create_window.parse_key_colour("#ffdc97"), (151, 220, 255))
+        self.assertEqual(create_window.parse_key_colour("255, 220, 151"), (151, 220, 255))
+
+    def test_rejects_bad_colours(self):
+        for colour in ("#ffdc9", "256,0,0", "red"):
+            with self.assertRaises(ValueError):
+                create_window.parse_key_colour(colour)
+
+class OverlayTest(WorkFolderTest):
+    def test_apply_divides_exactly_by_255(self):
+        width, height = OUTPUT_SIZE
+        rng = np.random.default_rng(1)
+        template = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+        cv2.imwrite(self.path("overlay.png"), template)
+        frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+        blended = Overlay(self.path("overlay.png")).apply(frame.copy())
+
+        alpha = template[:, :, 3:].astype(np.float64)
+        expected = np.floor((frame * (255 - alpha) + template[:, :, :3] * alpha) / 255 + 0.5)
+        np.testing.assert_array_equal(blended, expected.astype(np.uint8))
+
+    def test_refuses_an_opaque_template_without_holes(self):
+        cv2.imwrite(self.path("flat.png"), np.zeros((1920, 1080, 3), dtype=np.uint8))
+        with self.assertRaises(ValueError):
+            Overlay(self.path("flat.png"))
+        with self.assertRaises(ValueError):
+            Overlay(self.path("flat.png"), opacity=1.5)
+
+class PlaylistTest(WorkFolderTest):
+    def setUp(self):
+        super().setUp()
+        write_poster(self.path("a.jpg"), 1)
+        write_clip(self.path("clip.mp4"))
+
+    def load(self, data):
+        with open(self.path("show.json"), "w", encoding="utf-8") as playlist_file:
+            json.dump(data, playlist_file)
+        return load_playlist(self.path("show.json"))
+
+    def test_loads_settings_and_items(self):
+        playlist = self.load({"loop_count": 2, "default_length": 3,
+                              "items": ["a.jpg", {"path": "clip.mp4", "in": 0.5, "out": 2}]})
+        self.assertEqual(playlist["loop_count"], 2)
+        self.assertEqual(playlist["default_length"], 3)
+        self.assertEqual([item["kind"] for item in playlist["items"]], ["image", "video"])
+        self.assertEqual((playlist["items"][1]["in"], playlist["items"][1]["out"]), (0.5, 2.0))
+
+    def test_rejects_what_cannot_be_rendered(self):
+        for data in ({"loop_count": 0, "items": ["a.jpg"]},
+                     {"default_length": 0, "items": ["a.jpg"]},
+                     {"transition_length": -1, "items": ["a.jpg"]},
+                     [{"path": "a.jpg", "duration": -2}],
+                     [{"path": "a.jpg", "duration": "long"}],
+                     [{"path": "a.jpg", "in": 1}],
+                     [{"path": "clip.mp4", "in": 2, "out": 1}],
+                     [{"path": "clip.mp4", "in": -1}],
+                     ["missing.jpg"],
+                     []):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                self.load(data)
+
+    def test_plan_schedule_times_every_item(self):
+        entries = [make_entry(self.path("a.jpg"), "image", duration=2),
+                   make_entry(self.path("clip.mp4"), "video", start=0.5, end=2.0)]
+        plan = plan_schedule(entries, 10, loop_count=2, transition="crossfade", transition_seconds=0.5)
+
+        still, clip = plan["items"][:2]
+        self.assertEqual(still["frames"], 20)
+        self.assertEqual(clip["source_frames"], 15)
+        self.assertEqual(clip["frames"], kept_video_frames(15, 10, 10) * clip["repeats"])
+        self.assertEqual([item["first_frame"] for item in plan["items"]],
+                         [0, 20, 20 + clip["frames"], 40 + clip["frames"]])
+        self.assertEqual(plan["frames"], 2 * (20 + clip["frames"]))
+        # nothing comes before the first asset to blend from
+        self.assertEqual((still["transition"], still["transition_frames"]), ("cut", 0))
+        self.assertEqual(plan["items"][2]["transition_frames"], 5)
+
+    def test_plan_schedule_marks_unreadable_videos(self):
+        with open(self.path("broken.mp4"), "wb") as broken:
+            broken.write(b"not a video")
+        plan = plan_schedule([make_entry(self.path("broken.mp4"), "video")], 10)
+        self.assertTrue(plan["items"][0]["unreadable"])
+        self.assertEqual(plan["frames"], 0)
+
+class KeptVideoFramesTest(WorkFolderTest):
+    def test_matches_read_video_frames(self):
+        write_clip(self.path("clip.mp4"), fps=10, frames=25)
+        for fps in (10, 5, 3, 2):
+            with self.subTest(fps=fps):
+                read = sum(1 for frame in create_window.read_video_frames(self.path("clip.mp4"), fps))
+                self.assertEqual(read, kept_video_frames(25, 10, fps))
+
+@unittest.skipUnless(shutil.which("ffmpeg"), "segments need ffmpeg on the PATH")
+class SegmentJobsTest(WorkFolderTest):
+    def test_jobs_render_the_same_frames_as_serial(self):
+        os.makedirs(self.path("images"))
+        os.makedirs(self.path("videos"))
+        for index in range(3):
+            write_poster(self.path("images", f"poster{index}.jpg"), index)
+        write_clip(self.path("videos", "clip.mp4"))
+        playlist = {"loop_count": 1, "default_length": 1, "transition": None, "transition_length": None,
+                    "items": [make_entry(self.path("images", "poster0.jpg"), "image"),
+                              make_entry(self.path("images", "poster1.jpg"), "image"),
+                              make_entry(self.path("videos", "clip.mp4"), "video"),
+                              make_entry(self.path("images", "poster2.jpg"), "image")]}
+
+        frames = {}
+        for jobs in (1, 2):
+            output_folder = self.path(f"jobs{jobs}")
+            os.makedirs(output_folder)
+            output_video = os.path.join(output_folder, "window.mp4")
+            report = create_window.create_video_from_images(
+                self.path("images"), self.path("videos"), output_video, fps=2, segments=True,
+                cache_folder=self.path("cache"), jobs=jobs, encoder=create_window.make_encoder("libx264"),
+                playlist=playlist)
+            self.assertEqual(report["mode"], "segments")
+            frames[jobs] = read_all_frames(output_video)
+
+        self.assertEqual(len(frames[1]), report["frames"])
+        self.assertEqual(len(frames[1]), len(frames[2]))
+        for serial, parallel in zip(frames[1], frames[2]):
+            np.testing.assert_array_equal(serial, parallel)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,366 @@
+import functools
+import random
+
+import cv2
+import numpy as np
+
+# How an asset is placed on the portrait window canvas:
+#   stretch   - scale to the canvas ignoring aspect (the original behaviour)
+#   letterbox - fit inside the canvas with black bars
+#   blur      - fit inside the canvas over a blurred, zoomed copy of itself
+#   crop      - fill the canvas and crop what overflows
+FIT_MODES = ("stretch", "letterbox", "blur", "crop")
+
+# The window is a portrait 1080x1920 canvas shown on a landscape 1920x1080
+# output that the display turns back by 90 degrees.
+CANVAS_SIZE = (1080, 1920)
+OUTPUT_SIZE = (1920, 1080)
+
+# Other screens that can be rendered in the same pass as the window:
+#   portrait - the canvas the right way up, for the box office screen
+#   foyer    - the window output at 720p, for the foyer TV
+OUTPUT_TARGETS = {"portrait": CANVAS_SIZE, "foyer": (1280, 720)}
+
+# How one asset gives way to the next:
+#   cut       - straight to the next asset (the original behaviour)
+#   crossfade - blend from the last frame of one asset into the next
+#   dip       - fade the last frame to black, then fade the next one in
+#   slide     - the next asset pushes the last frame off the top of the window
+TRANSITIONS = ("cut", "crossfade", "dip", "slide")
+
+# the blurred background is made at 1/8 size, which is plenty once blurred
+BLUR_SCALE = 8
+BLUR_SIGMA = 3
+BLUR_DIM = 0.6
+
+# how far a pixel of an overlay without alpha may be from its key colour and
+# still count as a hole, enough to take in JPEG noise around a flat colour
+OVERLAY_KEY_TOLERANCE = 24
+
+class Compositor:
+    """
+    Places frames on the window canvas and rotates them into the output frame.
+
+    All work happens in buffers allocated up front: compose() writes into the
+    next of `buffers` output frames and returns it, so a caller that keeps
+    frames in a queue needs as many buffers as frames it can hold at once.
+    Frames that are already 1920x1080 are taken as finished output and are
+    returned unchanged, unless there is an overlay to blend onto them.
+    """
+    def __init__(self, fit="stretch", buffers=1, overlay=None):
+        if fit not in FIT_MODES:
+            raise ValueError(f"Unknown fit mode {fit}, expected one of {', '.join(FIT_MODES)}")
+        self.fit = fit
+        self.overlay = overlay
+        canvas_width, canvas_height = CANVAS_SIZE
+        output_width, output_height = OUTPUT_SIZE
+        self.canvas = np.zeros((canvas_height, canvas_width, 3), dtype=np.uint8)
+        self.outputs = [np.empty((output_height, output_width, 3), dtype=np.uint8) for _ in range(buffers)]
+        self.next_output = 0
+        self.small = np.empty((canvas_height // BLUR_SCALE, canvas_width // BLUR_SCALE, 3), dtype=np.uint8)
+        self.small_blurred = np.empty_like(self.small)
+
+    def compose(self, frame):
+        if frame.shape[0] == OUTPUT_SIZE[1] and frame.shape[1] == OUTPUT_SIZE[0]:
+            if self.overlay is None:
+                return frame
+            # finished frames may be shared or read-only, blend onto a copy
+            output = self.take_output()
+            np.copyto(output, frame)
+            return self.overlay.apply(output)
+        if self.fit == "stretch":
+            cv2.resize(frame, CANVAS_SIZE, dst=self.canvas)
+        elif self.fit == "crop":
+            cv2.resize(cover_crop(frame, CANVAS_SIZE), CANVAS_SIZE, dst=self.canvas)
+        else:
+            if self.fit == "blur":
+                self.blurred_background(frame)
+            self.place_fitted(frame, clear_borders=self.fit == "letterbox")
+        output = cv2.rotate(self.canvas, cv2.ROTATE_90_CLOCKWISE, dst=self.take_output())
+        if self.overlay is not None:
+            self.overlay.apply(output)
+        return output
+
+    def take_output(self):
+        output = self.outputs[self.next_output]
+        self.next_output = (self.next_output + 1) % len(self.outputs)
+        return output
+
+    def place_fitted(self, frame, clear_borders):
+        x, y, width, height = fit_rect(frame.shape[1], frame.shape[0], CANVAS_SIZE)
+        if clear_borders:
+            self.canvas[:y] = 0
+            self.canvas[y + height:] = 0
+            self.canvas[y:y + height, :x] = 0
+            self.canvas[y:y + height, x + width:] = 0
+        cv2.resize(frame, (width, height), dst=self.canvas[y:y + height, x:x + width], interpolation=cv2.INTER_AREA)
+
+    def blurred_background(self, frame):
+        small_height, small_width = self.small.shape[:2]
+        cv2.resize(cover_crop(frame, (small_width, small_height)), (small_width, small_height),
+                   dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.GaussianBlur(self.small, (0, 0), BLUR_SIGMA, dst=self.small_blurred)
+        cv2.convertScaleAbs(self.small_blurred, dst=self.small_blurred, alpha=BLUR_DIM)
+        cv2.resize(self.small_blurred, CANVAS_SIZE, dst=self.canvas)
+
+def ffmpeg_fit_filter(fit="stretch"):
+    """
+    ffmpeg filter graph that does what Compositor.compose() does to a frame.
+
+    The graph places a frame on the canvas with the fit mode and turns it
+    clockwise into the output frame, so a video can be decoded straight to
+    finished 1920x1080 frames. The scalers match OpenCV's interpolation but
+    not its rounding, so the output is close to, not identical with, the
+    OpenCV path.
+    """
+    if fit not in FIT_MODES:
+        raise ValueError(f"Unknown fit mode {fit}, expected one of {', '.join(FIT_MODES)}")
+    width, height = CANVAS_SIZE
+    if fit == "stretch":
+        placed = f"scale={width}:{height}:flags=bilinear"
+    elif fit == "crop":
+        placed = f"scale={width}:{height}:force_original_aspect_ratio=increase:flags=bilinear,crop={width}:{height}"
+    elif fit == "letterbox":
+        placed = (f"scale={width}:{height}:force_original_aspect_ratio=decrease:flags=area,"
+                  f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black")
+    else:
+        small_width, small_height = width // BLUR_SCALE, height // BLUR_SCALE
+        placed = (f"split=2[background][foreground];"
+                  f"[background]scale={small_width}:{small_height}:force_original_aspect_ratio=increase:flags=area,"
+                  f"crop={small_width}:{small_height},gblur=sigma={BLUR_SIGMA},"
+                  f"colorchannelmixer=rr={BLUR_DIM}:gg={BLUR_DIM}:bb={BLUR_DIM},scale={width}:{height}[blurred];"
+                  f"[foreground]scale={width}:{height}:force_original_aspect_ratio=decrease:flags=area[fitted];"
+                  f"[blurred][fitted]overlay=(W-w)/2:(H-h)/2")
+    # turning packed BGR is cheaper than turning the three planes of YUV
+    return placed + ",format=bgr24,transpose=1"
+
+def fit_rect(width, height, size):
+    """(x, y, width, height) of a width x height frame scaled to fit inside size, centred."""
+    target_width, target_height = size
+    scale = min(target_width / width, target_height / height)
+    fitted_width = max(1, min(target_width, round(width * scale)))
+    fitted_height = max(1, min(target_height, round(height * scale)))
+    return (target_width - fitted_width) // 2, (target_height - fitted_height) // 2, fitted_width, fitted_height
+
+def cover_crop(frame, size):
+    """Centre crop of frame with the aspect ratio of size, as a view without copying."""
+    target_width, target_height = size
+    height, width = frame.shape[:2]
+    if width * target_height > height * target_width:
+        crop_width = max(1, round(height * target_width / target_height))
+        x = (width - crop_width) // 2
+        return frame[:, x:x + crop_width]
+    crop_height = max(1, round(width * target_height / target_width))
+    y = (height - crop_height) // 2
+    return frame[y:y + crop_height]
+
+class Overlay:
+    """
+    A template laid over every output frame, such as a window frame or logo.
+
+    A template without an alpha channel is either keyed, with key a BGR
+    colour that marks its holes, or blended as a whole at an opacity below 1;
+    at full opacity it would hide every slide, which raises ValueError, as
+    does an opacity outside 0 to 1. The template is placed on the canvas and
+    rotated into output orientation once, then kept as its colour premultiplied by alpha and the inverse
+    alpha, both as uint16 planes. Blending is then integer math on the
+    part of the frame the template covers:
+    out = (frame * (255 - alpha) + colour * alpha) / 255.
+    """
+    def __init__(self, path, opacity=1.0, key=None):
+        if not 0 <= opacity <= 1:
+            raise ValueError(f"Overlay opacity must be from 0 to 1, got {opacity:g}")
+        template = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if template is None:
+            raise ValueError(f"Could not read overlay {path}")
+        if template.ndim == 2:
+            template = cv2.cvtColor(template, cv2.COLOR_GRAY2BGR)
+        if template.shape[2] == 4:
+            alpha = template[:, :, 3]
+            colour = np.ascontiguousarray(template[:, :, :3])
+        elif key is not None:
+            distance = np.abs(template.astype(np.int16) - np.array(key, dtype=np.int16)).max(axis=2)
+            alpha = np.where(distance <= OVERLAY_KEY_TOLERANCE, 0, 255).astype(np.uint8)
+            colour = template
+            print(f"Overlay {path} keyed on its holes, {100 * np.mean(alpha == 0):.0f}% of it shows the slide underneath")
+        elif opacity >= 1:
+            raise ValueError(f"Overlay {path} has no alpha channel, so at full opacity it would cover every slide. "
+                             "Save it with transparent holes, give the colour of its holes as a key, or lower the opacity")
+        else:
+            print(f"Overlay {path} has no alpha channel, it is blended at a fixed opacity of {opacity}")
+            alpha = np.full(template.shape[:2], 255, dtype=np.uint8)
+            colour = template
+        alpha = (alpha.astype(np.float32) * opacity).round().astype(np.uint8)
+
+        # same placement as a stretched slide, so templates are drawn portrait
+        if colour.shape[:2] != (OUTPUT_SIZE[1], OUTPUT_SIZE[0]):
+            colour = cv2.rotate(cv2.resize(colour, CANVAS_SIZE), cv2.ROTATE_90_CLOCKWISE)
+            alpha = cv2.rotate(cv2.resize(alpha, CANVAS_SIZE), cv2.ROTATE_90_CLOCKWISE)
+
+        # only blend the rows and columns the template actually covers
+        rows = np.flatnonzero(alpha.any(axis=1))
+        columns = np.flatnonzero(alpha.any(axis=0))
+        if len(rows) == 0:
+            self.region = None
+            return
+        self.region = (slice(rows[0], rows[-1] + 1), slice(columns[0], columns[-1] + 1))
+        alpha = alpha[self.region]
+        colour = colour[self.region]
+        self.premultiplied = colour.astype(np.uint16) * alpha[:, :, None]
+        self.inverse_alpha = np.repeat((255 - alpha.astype(np.uint16))[:, :, None], 3, axis=2)
+        self.blend = np.empty(self.premultiplied.shape, dtype=np.uint16)
+        self.carry = np.empty_like(self.blend)
+
+    def apply(self, frame):
+        """Blend the template into frame in place."""
+        if self.region is None:
+            return frame
+        target = frame[self.region]
+        blend, carry = self.blend, self.carry
+        np.multiply(target, self.inverse_alpha, out=blend)
+        np.add(blend, self.premultiplied, out=blend)
+        # divide by 255 with rounding: (x + 128 + ((x + 128) >> 8)) >> 8
+        np.add(blend, 128, out=blend)
+        np.right_shift(blend, 8, out=carry)
+        np.add(blend, carry, out=blend)
+        np.right_shift(blend, 8, out=blend)
+        np.copyto(target, blend, casting="unsafe")
+        return frame
+
+@functools.lru_cache(maxsize=None)
+def blend_ramp(frames):
+    """Eased weight of the incoming frame, from 0 to 1 exclusive, for each frame of a transition."""
+    steps = np.arange(1, frames + 1) / (frames + 1)
+    return tuple(float(weight) for weight in steps * steps * (3 - 2 * steps))
+
+class Transition:
+    """
+    Renders the frames that take the window from one asset to the next.
+
+    begin() keeps a copy of the last frame of the outgoing asset and picks the
+    style and length of the transition, then render(step, frame) draws
+    transition frame step towards frame, the current frame of the incoming
+    asset, into the next of `buffers` output frames. The blend ramp is shared
+    by every transition of the same length, so each frame is a single
+    addWeighted, scale or pair of row copies.
+    """
+    def __init__(self, buffers=1):
+        self.style = "cut"
+        self.frames = 0
+        self.ramp = ()
+        output_width, output_height = OUTPUT_SIZE
+        self.previous = np.zeros((output_height, output_width, 3), dtype=np.uint8)
+        self.outputs = [np.empty_like(self.previous) for _ in range(buffers)]
+        self.next_output = 0
+
+    def begin(self, frame, style, frames):
+        if style not in TRANSITIONS:
+            raise ValueError(f"Unknown transition {style}, expected one of {', '.join(TRANSITIONS)}")
+        np.copyto(self.previous, frame)
+        self.style = style
+        self.frames = frames
+        self.ramp = blend_ramp(frames)
+
+    def render(self, step, frame):
+        weight = self.ramp[step]
+        output = self.outputs[self.next_output]
+        self.next_output = (self.next_output + 1) % len(self.outputs)
+        if self.style == "crossfade":
+            cv2.addWeighted(self.previous, 1 - weight, frame, weight, 0, dst=output)
+        elif self.style == "dip":
+            if weight < 0.5:
+                cv2.convertScaleAbs(self.previous, dst=output, alpha=1 - 2 * weight)
+            else:
+                cv2.convertScaleAbs(frame, dst=output, alpha=2 * weight - 1)
+        else:
+            # output rows run down the portrait window from its left edge,
+            # so the window's top edge is the last output column
+            columns = OUTPUT_SIZE[0]
+            offset = round(weight * columns)
+            output[:, offset:] = self.previous[:, :columns - offset]
+            output[:, :offset] = frame[:, columns - offset:]
+        return output
+
+# corners and edge midpoints the zoomed in end of a Ken Burns move can sit on
+KEN_BURNS_ANCHORS = ((0, 0), (0.5, 0), (1, 0), (0, 0.5), (1, 0.5), (0, 1), (0.5, 1), (1, 1))
+
+@functools.lru_cache(maxsize=128)
+def ken_burns_schedule(frames, zoom, seed):
+    """
+    (x, y, width, height) crop of the output frame for each frame of a still's move.
+
+    seed picks whether the still zooms in or out and which edge or corner of
+    the frame it moves towards, so a still always gets the same move.
+    """
+    rng = random.Random(seed)
+    width, height = OUTPUT_SIZE
+    crop_width, crop_height = width / zoom, height / zoom
+    anchor_x, anchor_y = rng.choice(KEN_BURNS_ANCHORS)
+    near = (anchor_x * (width - crop_width), anchor_y * (height - crop_height), crop_width)
+    far = (0.0, 0.0, float(width))
+    start, end = (far, near) if rng.random() < 0.5 else (near, far)
+
+    schedule = []
+    for step in range(frames):
+        progress = step / (frames - 1) if frames > 1 else 0.0
+        x, y, rect_width = (a + (b - a) * progress for a, b in zip(start, end))
+        rect_width = min(width, round(rect_width))
+        rect_height = min(height, round(rect_width * height / width))
+        schedule.append((min(round(x), width - rect_width), min(round(y), height - rect_height), rect_width, rect_height))
+    return tuple(schedule)
+
+class KenBurns:
+    """
+    Slow zoom and pan across a still that is already in output orientation.
+
+    render(rect, frame) crops rect from frame, usually a step of
+    ken_burns_schedule(), and scales it back up into the next of `buffers`
+    output frames, blending the overlay on top so the overlay itself stays
+    put while the still moves underneath it.
+    """
+    def __init__(self, zoom=1.1, buffers=1, overlay=None):
+        if zoom < 1:
+            raise ValueError(f"Ken Burns zoom must be at least 1, got {zoom}")
+        self.zoom = zoom
+        self.overlay = overlay
+        output_width, output_height = OUTPUT_SIZE
+        self.outputs = [np.empty((output_height, output_width, 3), dtype=np.uint8) for _ in range(buffers)]
+        self.next_output = 0
+
+    def render(self, rect, frame):
+        x, y, width, height = rect
+        output = self.outputs[self.next_output]
+        self.next_output = (self.next_output + 1) % len(self.outputs)
+        cv2.resize(frame[y:y + height, x:x + width], OUTPUT_SIZE, dst=output, interpolation=cv2.INTER_LINEAR)
+        if self.overlay is not None:
+            self.overlay.apply(output)
+        return output
+
+class Retarget:
+    """
+    Turns finished output frames into the frames of another screen size.
+
+    A portrait size gets the canvas turned back the right way up, scaled when
+    it is not 1080x1920, and a landscape size gets the output frame scaled.
+    render() writes into one buffer allocated up front and returns it, so the
+    frame must be written out before the next call.
+    """
+    def __init__(self, size):
+        width, height = size
+        self.size = size
+        self.portrait = height > width
+        self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+        canvas_width, canvas_height = CANVAS_SIZE
+        self.canvas = np.empty((canvas_height, canvas_width, 3), dtype=np.uint8) if self.portrait else None
+
+    def render(self, frame):
+        if self.size == OUTPUT_SIZE:
+            return frame
+        if self.portrait:
+            if self.size == CANVAS_SIZE:
+                cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE, dst=self.buffer)
+                return self.buffer
+            cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE, dst=self.canvas)
+            frame = self.canvas
+        cv2.resize(frame, self.size, dst=self.buffer, interpolation=cv2.INTER_AREA)
+        return self.buffer
@@ -0,0 +1,305 @@
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+
+import cv2
+from natsort import natsorted
+
+from window_compositor import TRANSITIONS
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+VIDEO_EXTENSIONS = (".mp4",)
+
+# every kept video frame is written twice
+VIDEO_REPEATS = 2
+
+# keys an item of a playlist file may set, anything else is a typo
+ITEM_KEYS = ("path", "duration", "in", "out", "transition", "transition_length")
+
+def asset_kind(path):
+    """"image" or "video" by file extension, None for anything else."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        return "image"
+    if extension in VIDEO_EXTENSIONS:
+        return "video"
+    return None
+
+def make_entry(path, kind, duration=None, start=None, end=None, transition=None, transition_length=None):
+    """One asset of a playlist. Settings left as None fall back to the playlist or command line."""
+    return {
+        "name": os.path.basename(path),
+        "path": path,
+        "kind": kind,
+        "duration": duration,
+        "in": start,
+        "out": end,
+        "transition": transition,
+        "transition_length": transition_length,
+    }
+
+def folder_playlist(image_folder, video_folder, randomise=False):
+    """Playlist of the images and videos in the asset folders, natural sort order or shuffled."""
+    images = [img for img in os.listdir(image_folder) if img.endswith(".png") or img.endswith(".jpg")or img.endswith(".jpeg")]
+    if not images:
+        print("No images found in the folder.")
+        return None
+
+    videos=[vid for vid in os.listdir(video_folder) if vid.endswith(".mp4")]
+    if videos:
+        print(f"{len(videos)} Videos found in the folder.")
+
+    assets=images+videos
+
+    print(f"Found {len(assets)} assets in the folders.")
+
+    if randomise:
+        random.shuffle(assets)
+        print("Randomised the order of assets")
+    else:
+        assets = natsorted(assets)
+        print("assets will be displayed in the order they are named")
+
+    return [make_entry(os.path.join(video_folder if asset.endswith(".mp4") else image_folder, asset), asset_kind(asset))
+            for asset in assets]
+
+def load_playlist(playlist_path):
+    """
+    Read a JSON or YAML playlist file.
+
+    The file holds a list of items, or an object with an items list and
+    optional loop_count, default_length, transition and transition_length
+    defaults. An item is an asset path, or an object with a path and any of
+    duration (seconds a still is shown), in and out (seconds into a video),
+    transition and transition_length. Paths are relative to the playlist.
+
+    Returns a dict of the settings and normalized items, raising ValueError
+    for anything that cannot be rendered.
+    """
+    with open(playlist_path, encoding="utf-8") as playlist_file:
+        if playlist_path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Reading a YAML playlist needs PyYAML, install it with pip install pyyaml")
+            data = yaml.safe_load(playlist_file)
+        else:
+            data = json.load(playlist_file)
+    if isinstance(data, list):
+        data = {"items": data}
+    if not isinstance(data, dict) or not data.get("items"):
+        raise ValueError(f"Playlist {playlist_path} has no items")
+
+    playlist = {
+        "loop_count": data.get("loop_count", 1),
+        "default_length": optional_float(data, "default_length", "Playlist"),
+        "transition": data.get("transition"),
+        "transition_length": optional_float(data, "transition_length", "Playlist"),
+    }
+    if isinstance(playlist["loop_count"], bool) or not isinstance(playlist["loop_count"], int) or playlist["loop_count"] < 1:
+        raise ValueError(f"Playlist loop_count must be a whole number of at least 1, got {playlist['loop_count']!r}")
+    if playlist["default_length"] is None:
+        playlist["default_length"] = 15.0
+    elif playlist["default_length"] <= 0:
+        raise ValueError(f"Playlist default_length must be more than 0 seconds, got {playlist['default_length']:g}")
+    if playlist["transition_length"] is not None and playlist["transition_length"] < 0:
+        raise ValueError(f"Playlist transition_length cannot be negative, got {playlist['transition_length']:g}")
+    if playlist["transition"] is not None and playlist["transition"] not in TRANSITIONS:
+        raise ValueError(f"Unknown transition {playlist['transition']}, expected one of {', '.join(TRANSITIONS)}")
+
+    base_folder = os.path.dirname(os.path.abspath(playlist_path))
+    entries = []
+    for position, item in enumerate(data["items"], 1):
+        if isinstance(item, str):
+            item = {"path": item}
+        unknown = set(item) - set(ITEM_KEYS)
+        if "path" not in item or unknown:
+            raise ValueError(f"Playlist item {position} needs a path and only {', '.join(ITEM_KEYS)}, got {item}")
+        path = os.path.join(base_folder, item["path"])
+        kind = asset_kind(path)
+        if kind is None:
+            raise ValueError(f"Playlist item {position}: {item['path']} is not a png, jpg or mp4 file")
+        if not os.path.isfile(path):
+            raise ValueError(f"Playlist item {position}: {item['path']} not found")
+        if item.get("transition") is not None and item["transition"] not in TRANSITIONS:
+            raise ValueError(f"Playlist item {position}: unknown transition {item['transition']}")
+        if kind == "image" and ("in" in item or "out" in item):
+            raise ValueError(f"Playlist item {position}: in and out points only apply to videos")
+        if kind == "video" and "duration" in item:
+            raise ValueError(f"Playlist item {position}: set in and out points to shorten a video, not a duration")
+        label = f"Playlist item {position}"
+        duration, start, end, transition_length = (optional_float(item, key, label)
+                                                   for key in ("duration", "in", "out", "transition_length"))
+        if duration is not None and duration <= 0:
+            raise ValueError(f"{label}: duration must be more than 0 seconds, got {duration:g}")
+        if start is not None and start < 0:
+            raise ValueError(f"{label}: in point cannot be negative, got {start:g}")
+        if end is not None and end <= (start or 0):
+            raise ValueError(f"{label}: out point must come after the in point, got {end:g}")
+        if transition_length is not None and transition_length < 0:
+            raise ValueError(f"{label}: transition_length cannot be negative, got {transition_length:g}")
+        entries.append(make_entry(path, kind, duration, start, end, item.get("transition"), transition_length))
+    playlist["items"] = entries
+    return playlist
+
+def optional_float(item, key, label="Playlist"):
+    """item[key] as a float, None when it is not set, raising ValueError for anything but a number."""
+    value = item.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{label}: {key} must be a number of seconds, got {value!r}")
+    return float(value)
+
+def probe_image_size(img_path):
+    """
+    Read (width, height) from a JPEG or PNG header without decoding the image, or None.
+
+    A JPEG whose EXIF orientation turns it a quarter turn (5 to 8), as phone
+    photos taken upright usually are, reports its sides swapped, the way
+    cv2.imread() returns it.
+    """
+    orientation = 1
+    with open(img_path, "rb") as image_file:
+        head = image_file.read(24)
+        if head[:8] == b"\x89PNG\r\n\x1a\n" and len(head) == 24:
+            return struct.unpack(">II", head[16:24])
+        if head[:2] != b"\xff\xd8":
+            return None
+        image_file.seek(2)
+        while True:
+            if image_file.read(1) != b"\xff":
+                return None
+            code = image_file.read(1)
+            while code == b"\xff":  # fill bytes before the marker code
+                code = image_file.read(1)
+            if not code:
+                return None
+            code = code[0]
+            if code == 0x01 or 0xD0 <= code <= 0xD9:
+                continue  # markers without a length
+            length = image_file.read(2)
+            if len(length) < 2:
+                return None
+            if code == 0xE1 and orientation == 1:
+                segment = image_file.read(struct.unpack(">H", length)[0] - 2)
+                orientation = exif_orientation(segment)
+                continue
+            # start of frame markers carry the size, other than DHT, JPG and DAC
+            if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                frame_header = image_file.read(5)
+                if len(frame_header) < 5:
+                    return None
+                height, width = struct.unpack(">HH", frame_header[1:5])
+                return (height, width) if 5 <= orientation <= 8 else (width, height)
+            image_file.seek(struct.unpack(">H", length)[0] - 2, 1)
+
+def exif_orientation(segment):
+    """The Orientation tag (1 to 8) of a JPEG APP1 segment, 1 when it is not EXIF or has none."""
+    if segment[:6] != b"Exif\0\0":
+        return 1
+    tiff = segment[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return 1
+    ifd = struct.unpack(order + "I", tiff[4:8])[0]
+    if ifd + 2 > len(tiff):
+        return 1
+    count = struct.unpack(order + "H", tiff[ifd:ifd + 2])[0]
+    for entry in range(ifd + 2, min(ifd + 2 + count * 12, len(tiff) - 11), 12):
+        tag, kind = struct.unpack(order + "HH", tiff[entry:entry + 4])
+        if tag == 0x0112 and kind == 3:  # Orientation, a SHORT stored in the value field
+            value = struct.unpack(order + "H", tiff[entry + 8:entry + 10])[0]
+            return value if 1 <= value <= 8 else 1
+    return 1
+
+def probe_video(video_path):
+    """
+    (fps, frame count, width, height) of a video from its container header, without decoding it.
+
+    Containers that do not store a frame count are asked again with ffprobe,
+    which counts the packets, when it is on the PATH.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video {video_path}")
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        cap.release()
+    if frame_count <= 0 and shutil.which("ffprobe"):
+        result = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-count_packets",
+                                 "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", video_path],
+                                capture_output=True, text=True)
+        if result.returncode == 0 and result.stdout.strip().isdigit():
+            frame_count = int(result.stdout.strip())
+    return video_fps, max(0, frame_count), width, height
+
+def video_frame_range(video_fps, frame_count, start=None, end=None):
+    """First frame and frame after the last between the in and out points, in seconds."""
+    first = min(frame_count, max(0, round(start * video_fps))) if start else 0
+    last = min(frame_count, max(first, round(end * video_fps))) if end is not None else frame_count
+    return first, last
+
+def kept_video_frames(frames, video_fps, fps):
+    """How many of a video's frames the renderer keeps, matching read_video_frames()."""
+    # one frame is kept after every int(video_fps/fps) skipped
+    return frames // (int(video_fps / fps) + 1)
+
+def plan_schedule(entries, fps, default_length=15, loop_count=1, transition="cut", transition_seconds=1.0):
+    """
+    Work out every frame of a render before any asset is decoded.
+
+    Stills are timed from their duration and videos from their header and
+    in and out points. Returns a dict with the total frames and duration and
+    an items list holding, for each asset in each loop, its first frame, its
+    frame count and how it is rendered: repeats (frames per still, copies
+    of each kept video frame), in and out, and the transition into it.
+
+    A video that cannot be opened is planned with no frames, no size and
+    unreadable set, for the caller to warn about or skip.
+    """
+    probed = {}
+    items = []
+    first_frame = 0
+    for loop in range(loop_count):
+        for entry in entries:
+            style = entry["transition"] or transition
+            length = entry["transition_length"] if entry["transition_length"] is not None else transition_seconds
+            item = dict(entry, loop=loop, first_frame=first_frame, transition=style,
+                        transition_frames=int(round(fps * length)) if style != "cut" else 0)
+            if entry["kind"] == "image":
+                item["duration"] = entry["duration"] if entry["duration"] is not None else default_length
+                item["repeats"] = int(fps * item["duration"])
+                item["frames"] = item["repeats"]
+            else:
+                if entry["path"] not in probed:
+                    try:
+                        probed[entry["path"]] = probe_video(entry["path"])
+                    except ValueError:
+                        probed[entry["path"]] = None
+                if probed[entry["path"]] is None or probed[entry["path"]][0] <= 0:
+                    item.update(size=None, video_fps=0.0, source_frames=0, repeats=VIDEO_REPEATS,
+                                frames=0, duration=0.0, unreadable=True)
+                    items.append(item)
+                    continue
+                video_fps, frame_count, width, height = probed[entry["path"]]
+                first, last = video_frame_range(video_fps, frame_count, entry["in"], entry["out"])
+                item["size"] = (width, height)
+                item["video_fps"] = video_fps
+                item["source_frames"] = last - first
+                item["repeats"] = VIDEO_REPEATS
+                item["frames"] = kept_video_frames(last - first, video_fps, fps) * VIDEO_REPEATS
+                item["duration"] = item["frames"] / fps
+            first_frame += item["frames"]
+            items.append(item)
+    if items:
+        # there is nothing before the first asset to blend from
+        items[0]["transition"] = "cut"
+        items[0]["transition_frames"] = 0
+    return {"items": items, "frames": first_frame, "duration": first_frame / fps, "loop_count": loop_count}
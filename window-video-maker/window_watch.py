@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+
+from window_playlist import asset_kind
+
+def folder_snapshot(paths):
+    """
+    {path: (size, mtime_ns)} of the assets in the watched folders and files.
+
+    Only png, jpg and mp4 files are listed, so the temporary names copy tools
+    and browsers write to do not count until the file is renamed into place.
+    """
+    snapshot = {}
+    for path in paths:
+        if os.path.isfile(path):
+            entries = [path]
+        elif os.path.isdir(path):
+            entries = [entry.path for entry in os.scandir(path)
+                       if not entry.name.startswith(".") and asset_kind(entry.name)]
+        else:
+            continue
+        for entry in entries:
+            try:
+                stat = os.stat(entry)
+            except OSError:
+                continue  # removed between the listing and the stat
+            snapshot[entry] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+def describe_changes(old, new):
+    """One line listing the added, removed and changed files between two snapshots."""
+    added = [os.path.basename(path) for path in new if path not in old]
+    removed = [os.path.basename(path) for path in old if path not in new]
+    changed = [os.path.basename(path) for path in new if path in old and new[path] != old[path]]
+    parts = [f"{label} {', '.join(sorted(names))}" for label, names in
+             (("added", added), ("removed", removed), ("changed", changed)) if names]
+    return "; ".join(parts) or "no changes"
+
+def start_notifier(paths, wake):
+    """
+    Set wake whenever the file system reports a change under paths.
+
+    Uses the watchdog package (inotify on Linux) when it is installed, so a
+    change is noticed at once instead of at the next poll. Returns the
+    observer to stop, or None when watching falls back to polling alone.
+    """
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class WakeHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            wake.set()
+
+    observer = Observer()
+    handler = WakeHandler()
+    for folder in sorted({path if os.path.isdir(path) else os.path.dirname(os.path.abspath(path)) for path in paths}):
+        if os.path.isdir(folder):
+            observer.schedule(handler, folder, recursive=False)
+    observer.start()
+    return observer
+
+def watch_folders(paths, on_change, interval=1.0, debounce=2.0, snapshot=None):
+    """
+    Call on_change() every time the assets under paths change, until interrupted.
+
+    The folders are polled every interval seconds, or woken early by
+    start_notifier(). A burst of changes, such as a batch of posters being
+    copied in, is waited out until nothing has changed for debounce seconds,
+    so on_change() runs once for the batch and never sees a half copied file.
+    A failing on_change() is reported and watching carries on.
+
+    snapshot is the folder_snapshot() the assets are compared with first.
+    Take it before a render that runs ahead of watching, so files that land
+    during that render still count as changes.
+    """
+    wake = threading.Event()
+    observer = start_notifier(paths, wake)
+    method = "file system events" if observer else f"polling every {interval:g}s"
+    print(f"Watching {', '.join(paths)} for changes ({method}), press Ctrl+C to stop")
+    if snapshot is None:
+        snapshot = folder_snapshot(paths)
+    try:
+        while True:
+            wake.wait(interval)
+            wake.clear()
+            current = folder_snapshot(paths)
+            if current == snapshot:
+                continue
+            # let the burst settle before rendering
+            settled_since = time.monotonic()
+            while time.monotonic() - settled_since < debounce:
+                wake.wait(min(interval, debounce))
+                wake.clear()
+                latest = folder_snapshot(paths)
+                if latest != current:
+                    current = latest
+                    settled_since = time.monotonic()
+            print(f"Assets changed: {describe_changes(snapshot, current)}")
+            snapshot = current
+            try:
+                on_change()
+            except Exception as e:
+                print(f"Render failed, waiting for the next change: {e}")
+            # files written while rendering are picked up by the next pass
+            print(f"Watching {', '.join(paths)} for changes")
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        if observer:
+            observer.stop()
+            observer.join()